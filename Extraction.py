@@ -0,0 +1,154 @@
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Iterator, List, Tuple
+
+PAGES_PER_TASK = 16
+# Spawning workers costs around a second, so small documents stay in-process.
+PARALLEL_MIN_PAGES = 64
+
+# Workers are spawned rather than forked: the Streamlit server, the async loop
+# and chromadb all run threads, and forking a threaded process can deadlock.
+_mp_context = multiprocessing.get_context("spawn")
+
+_worker_reader = None
+
+
+def _init_worker(pdf_bytes: bytes):
+    # Parse the document once per worker process, not once per page range.
+    global _worker_reader
+    import PyPDF2
+    _worker_reader = PyPDF2.PdfReader(BytesIO(pdf_bytes))
+
+
+def _extract_page_range(start: int, end: int) -> List[str]:
+    return [_worker_reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def iter_pdf_pages(
+    pdf_bytes: bytes,
+    max_workers: int = None,
+    pages_per_task: int = PAGES_PER_TASK
+) -> Iterator[Tuple[int, int, str]]:
+    """Yield (page_number, page_count, text) for each page, in order.
+
+    Page ranges are parsed in a process pool, and pages are yielded as soon as
+    their range is done, so callers can start work before the last page is
+    parsed. The first range is parsed in-process while the pool starts up,
+    and short documents never use the pool.
+    """
+    import PyPDF2
+
+    reader = PyPDF2.PdfReader(BytesIO(pdf_bytes))
+    page_count = len(reader.pages)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    if max_workers == 1 or page_count < max(PARALLEL_MIN_PAGES, 2 * pages_per_task):
+        for i, page in enumerate(reader.pages):
+            yield i + 1, page_count, page.extract_text() or ""
+        return
+
+    ranges = [
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    ]
+    pool = ProcessPoolExecutor(
+        max_workers=min(max_workers, len(ranges)),
+        mp_context=_mp_context,
+        initializer=_init_worker,
+        initargs=(pdf_bytes,)
+    )
+    try:
+        futures = [pool.submit(_extract_page_range, start, end) for start, end in ranges[1:]]
+        for i in range(*ranges[0]):
+            yield i + 1, page_count, reader.pages[i].extract_text() or ""
+        for (start, _), future in zip(ranges[1:], futures):
+            for offset, text in enumerate(future.result()):
+                yield start + offset + 1, page_count, text
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_pdf_content(pdf_file, progress_callback=None, max_workers=None):
+    try:
+        pages = []
+        for page_number, page_count, text in iter_pdf_pages(pdf_file.read(), max_workers=max_workers):
+            pages.append(text)
+            if progress_callback:
+                progress_callback(page_number, page_count)
+        
+        return "\n".join(pages).strip()
+    
+    except Exception as e:
+        return f"Error extracting PDF content: {str(e)}"
+
+
+def extract_youtube_transcript(url):
+    try:
+        video_id = None
+        patterns = [
+            r'(?:youtube\.com\/watch\?v=|youtu\.be\/)([^&\n?#]+)',
+            r'youtube\.com\/embed\/([^&\n?#]+)',
+            r'youtube\.com\/v\/([^&\n?#]+)'
+        ]
+        
+        for pattern in patterns:
+            match = re.search(pattern, url)
+            if match:
+                video_id = match.group(1)
+                break
+        
+        if not video_id:
+            return "Error: Invalid YouTube URL"
+
+        from youtube_transcript_api import YouTubeTranscriptApi
+        
+        transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
+
+        transcript_text = " ".join([segment['text'] for segment in transcript_list])
+        
+        return transcript_text
+    
+    except Exception as e:
+        return f"Error extracting YouTube transcript: {str(e)}"
+
+
+def extract_source(kind: str, location: str) -> str:
+    """Text of a "pdf" path or "youtube" URL, or an "Error..." string like the extractors.
+
+    Meant for spawned pool workers, so this module imports nothing heavy and
+    PDFs are parsed in-process rather than in a pool of their own.
+    """
+    if kind == "pdf":
+        with open(location, "rb") as f:
+            return extract_pdf_content(f, max_workers=1)
+    return extract_youtube_transcript(location)
+
+
+def chunk_text(text: str, chunk_size: int, overlap: int = 0) -> List[str]:
+    """Split text into chunks of at most chunk_size characters.
+
+    Cuts prefer paragraph, line, sentence and word boundaries, in that order,
+    as long as the chunk stays at least half full.
+    """
+    chunks = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + chunk_size, length)
+        if end < length:
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = text.rfind(separator, start + chunk_size // 2, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
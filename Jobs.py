@@ -0,0 +1,600 @@
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from MongoData import (jobs_collection, chats_collection, get_active_source, get_chat_info,
+    get_source_text, read_source_text, save_messages)
+from Workflow import stream_linkedin_post, stream_medium_blog
+
+# Generations run as jobs: the request is stored in Mongo, a worker thread
+# (in the Streamlit process or a separate `python Jobs.py` process) runs the
+# workflow and writes its progress back to the job, and the UI and the HTTP
+# API follow the job record. A job outlives the script run that submitted it.
+
+# Worker threads in each process that calls start_workers(); set to 0 on the
+# web tier when dedicated worker processes run the jobs.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_API_PORT = os.getenv("JOB_API_PORT")
+# The API has no authentication, so it only listens locally unless told otherwise.
+JOB_API_HOST = os.getenv("JOB_API_HOST", "127.0.0.1")
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# A running job whose worker has not written for this long is claimed again.
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = 3
+# A job still running after this long is failed. LLM calls have no timeout,
+# so without a limit a hung call would keep its job running indefinitely.
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "1800"))
+JOB_HEARTBEAT_INTERVAL = 30
+JOB_PROGRESS_INTERVAL = 1.0
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+# Held while the result is posted to the chat, so a job is only seen finished
+# once its messages are there.
+FINISHING = "finishing"
+ACTIVE_STATUSES = (QUEUED, RUNNING, FINISHING)
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+JOB_PLATFORMS = ("Medium", "LinkedIn")
+
+# The digest node's summaries run in parallel and their tokens interleave,
+# so only its stage message is kept.
+_UNSTREAMED_NODES = {"digest_source"}
+
+# Wakes this process's idle workers as soon as it submits a job.
+_job_submitted = threading.Event()
+
+
+def _object_id(value) -> Optional[ObjectId]:
+    if value is None or isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(str(value))
+    except InvalidId:
+        return None
+
+
+def submit_job(chat_id, platform, user_request, source_id=None, bypass_cache=False) -> ObjectId:
+    if platform not in JOB_PLATFORMS:
+        raise ValueError(f"No workflow registered for platform: {platform}")
+    now = datetime.utcnow()
+    job = {
+        "chat_id": chat_id,
+        "platform": platform,
+        "user_request": user_request,
+        "source_id": source_id,
+        "bypass_cache": bypass_cache,
+        "status": QUEUED,
+        "current_node": None,
+        "queue_position": None,
+        "stages": [],
+        "outputs": {},
+        "result": None,
+        "error": None,
+        "attempts": 0,
+        "worker": None,
+        "created_at": now,
+        "updated_at": now,
+        "started_at": None,
+        "heartbeat_at": None,
+        "finished_at": None
+    }
+    job_id = jobs_collection.insert_one(job).inserted_id
+    _job_submitted.set()
+    return job_id
+
+
+def get_job(job_id):
+    job_id = _object_id(job_id)
+    return jobs_collection.find_one({"_id": job_id}) if job_id else None
+
+
+def get_active_job(chat_id):
+    """The chat's most recent job that hasn't finished, if any."""
+    return jobs_collection.find_one(
+        {"chat_id": chat_id, "status": {"$in": list(ACTIVE_STATUSES)}},
+        sort=[("created_at", DESCENDING)]
+    )
+
+
+def list_jobs(chat_id, limit=20) -> List[Dict[str, Any]]:
+    return list(jobs_collection.find(
+        {"chat_id": chat_id},
+        {"outputs": 0}
+    ).sort("created_at", DESCENDING).limit(limit))
+
+
+def claim_job(worker_id: str):
+    """Atomically take the oldest queued job, or a running one whose worker went quiet."""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=JOB_STALE_SECONDS)
+    return jobs_collection.find_one_and_update(
+        {"$or": [
+            {"status": QUEUED},
+            {"status": RUNNING, "heartbeat_at": {"$lt": stale}, "attempts": {"$lt": JOB_MAX_ATTEMPTS}}
+        ]},
+        {
+            "$set": {
+                "status": RUNNING,
+                "worker": worker_id,
+                "current_node": None,
+                "queue_position": None,
+                "stages": [],
+                "outputs": {},
+                "started_at": now,
+                "heartbeat_at": now,
+                "updated_at": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def fail_abandoned_jobs():
+    stale = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+    abandoned = jobs_collection.find(
+        {"status": RUNNING, "heartbeat_at": {"$lt": stale}, "attempts": {"$gte": JOB_MAX_ATTEMPTS}},
+        {"chat_id": 1, "platform": 1, "worker": 1}
+    )
+    for job in abandoned:
+        finish_job(job, {"success": False, "error": f"Job stopped responding {JOB_MAX_ATTEMPTS} times"})
+
+    # A worker that died while posting the result leaves its job finishing.
+    now = datetime.utcnow()
+    jobs_collection.update_many(
+        {"status": FINISHING, "heartbeat_at": {"$lt": stale}},
+        {"$set": {
+            "status": FAILED,
+            "error": "Job stopped responding while posting its result",
+            "finished_at": now,
+            "updated_at": now
+        }}
+    )
+
+
+class JobProgress:
+    """Writes a job's stream events to its record.
+
+    Stage and queue events are written as they arrive; streamed tokens are
+    accumulated per node and written at most every ``interval`` seconds.
+    Writes only apply while the job is running on this worker; ``lost`` is
+    set once one finds it reclaimed, timed out or deleted.
+    """
+
+    def __init__(self, job, interval: float = JOB_PROGRESS_INTERVAL):
+        self.job_id = job["_id"]
+        self.worker = job["worker"]
+        self.interval = interval
+        self.lost = False
+        self._outputs = {}
+        self._dirty = set()
+        self._current_node = None
+        self._last_write = 0.0
+
+    def _write(self, fields, push=None):
+        now = datetime.utcnow()
+        update = {"$set": dict(fields, updated_at=now, heartbeat_at=now)}
+        if push:
+            update["$push"] = push
+        written = jobs_collection.update_one(
+            {"_id": self.job_id, "worker": self.worker, "status": RUNNING}, update
+        )
+        if written.matched_count == 0:
+            self.lost = True
+        self._last_write = time.monotonic()
+
+    def _pending_outputs(self):
+        fields = {f"outputs.{node}": self._outputs[node] for node in self._dirty}
+        self._dirty.clear()
+        return fields
+
+    def on_event(self, event):
+        node = event.get("node")
+        if event["type"] == "token":
+            if node not in _UNSTREAMED_NODES:
+                self._outputs[node] = self._outputs.get(node, "") + event["content"]
+                self._dirty.add(node)
+            if node != self._current_node:
+                self._current_node = node
+                self._write(dict(self._pending_outputs(), current_node=node, queue_position=None))
+            elif time.monotonic() - self._last_write >= self.interval:
+                self._write(self._pending_outputs())
+        elif event["type"] == "queued":
+            self._current_node = None
+            self._write(dict(self._pending_outputs(), current_node=node, queue_position=event["position"]))
+        elif event["type"] == "stage":
+            self._current_node = None
+            self._write(
+                dict(self._pending_outputs(), current_node=None, queue_position=None),
+                push={"stages": {"node": node, "message": event["message"], "finished_at": datetime.utcnow()}}
+            )
+
+
+def final_response(platform: str, result: Dict[str, Any]) -> str:
+    if not result["success"]:
+        return f"❌ Error: {result['error']}"
+    if platform == "Medium":
+        return f"## 🎉 Your Medium Blog is Ready!\n\n{result['final_blog']}"
+    return f"## 🎉 Your LinkedIn Post is Ready!\n\n{result['final_post']}\n\n---\n\n**📊 Character Count:** {len(result['final_post'])} characters"
+
+
+def run_job(job):
+    """Run a claimed job's workflow, recording progress, and post the result to its chat."""
+    chat_id = job["chat_id"]
+    source_id = job.get("source_id")
+    if source_id is not None:
+        raw_content = get_source_text(source_id)
+    else:
+        # Use the stored source's id too, so the workflow finds the chunks
+        # indexed at upload instead of indexing the text again.
+        source = get_active_source(chat_id)
+        raw_content = read_source_text(source) if source else None
+        source_id = source["_id"] if source else None
+
+    if not raw_content:
+        result = {"success": False, "error": "No source content to generate from"}
+    else:
+        stream = stream_medium_blog if job["platform"] == "Medium" else stream_linkedin_post
+        progress = JobProgress(job)
+        result = None
+        try:
+            for event in stream(
+                chat_id=chat_id,
+                raw_content=raw_content,
+                user_request=job["user_request"],
+                platform=job["platform"],
+                bypass_cache=job.get("bypass_cache", False),
+                source_id=source_id
+            ):
+                if event["type"] == "result":
+                    result = event["result"]
+                else:
+                    progress.on_event(event)
+                    if progress.lost:
+                        # Nothing this run produces can be recorded any more.
+                        result = {"success": False, "error": "Job is no longer held by this worker"}
+                        break
+        except Exception as e:
+            result = {"success": False, "error": f"Error running job: {str(e)}"}
+
+    finish_job(job, result)
+    return result
+
+
+def finish_job(job, result):
+    """Post the result to the job's chat and mark the job finished.
+
+    Returns False, posting nothing, when this worker no longer holds the job.
+    """
+    now = datetime.utcnow()
+    # Only the worker still holding the job finishes it; a worker whose job
+    # was reclaimed or failed meanwhile must not post a second response.
+    claimed = jobs_collection.update_one(
+        {"_id": job["_id"], "worker": job["worker"], "status": RUNNING},
+        {"$set": {
+            "status": FINISHING,
+            "current_node": None,
+            "queue_position": None,
+            "heartbeat_at": now,
+            "updated_at": now
+        }}
+    )
+    if claimed.matched_count != 1:
+        return False
+
+    contents = [final_response(job["platform"], result)]
+    if result["success"]:
+        contents = [message.content for message in result["workflow_messages"]] + contents
+
+    try:
+        # The chat may have been deleted while the job ran; read it from Mongo,
+        # since the chat info cache may be another process's or out of date.
+        if chats_collection.find_one({"_id": job["chat_id"]}, {"_id": 1}):
+            save_messages(job["chat_id"], [
+                {"role": "assistant", "content": content, "platform": job["platform"]}
+                for content in contents
+            ])
+    finally:
+        now = datetime.utcnow()
+        jobs_collection.update_one(
+            {"_id": job["_id"], "worker": job["worker"], "status": FINISHING},
+            {"$set": {
+                "status": SUCCEEDED if result["success"] else FAILED,
+                "result": {key: value for key, value in result.items() if key != "workflow_messages"},
+                "error": result.get("error"),
+                "finished_at": now,
+                "updated_at": now
+            }}
+        )
+    return True
+
+
+class JobWorker:
+    """Threads that claim queued jobs from Mongo and run them.
+
+    Any number of processes can run workers against the same database:
+    claims are atomic, and a job whose worker stops writing for
+    JOB_STALE_SECONDS is picked up again, up to JOB_MAX_ATTEMPTS times. A
+    job that runs longer than JOB_TIMEOUT_SECONDS is failed.
+    """
+
+    def __init__(self, concurrency: int = JOB_WORKERS, poll_interval: float = JOB_POLL_INTERVAL):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._threads = []
+        # job id -> (job, monotonic start time)
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.concurrency):
+            thread = threading.Thread(
+                target=self._run, args=(f"{self.worker_id}:{i}",), name=f"job-worker-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        return self
+
+    def stop(self, timeout: float = None):
+        """Stop claiming jobs and wait for the running ones to finish."""
+        self._stop.set()
+        _job_submitted.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self, worker_id: str):
+        while not self._stop.is_set():
+            try:
+                job = claim_job(worker_id)
+                if job is None:
+                    fail_abandoned_jobs()
+            except Exception as e:
+                print(f"Error claiming job: {e}")
+                job = None
+
+            if job is None:
+                if _job_submitted.wait(self.poll_interval):
+                    _job_submitted.clear()
+                continue
+
+            with self._lock:
+                self._running[job["_id"]] = (job, time.monotonic())
+            try:
+                run_job(job)
+            except Exception as e:
+                print(f"Error running job {job['_id']}: {e}")
+            finally:
+                with self._lock:
+                    self._running.pop(job["_id"], None)
+
+    def _heartbeat(self):
+        # Jobs waiting in the LLM queue produce no events, so the heartbeat
+        # doesn't depend on progress writes; it stops at JOB_TIMEOUT_SECONDS.
+        while not self._stop.wait(JOB_HEARTBEAT_INTERVAL):
+            with self._lock:
+                running = dict(self._running)
+            if not running:
+                continue
+            now = time.monotonic()
+            alive = [job_id for job_id, (_, started) in running.items() if now - started <= JOB_TIMEOUT_SECONDS]
+            try:
+                if alive:
+                    jobs_collection.update_many(
+                        {
+                            "$or": [{"_id": job_id, "worker": running[job_id][0]["worker"]} for job_id in alive],
+                            "status": RUNNING
+                        },
+                        {"$set": {"heartbeat_at": datetime.utcnow()}}
+                    )
+                for job_id, (job, started) in running.items():
+                    if job_id not in alive:
+                        self._fail_overdue(job)
+            except Exception as e:
+                print(f"Error updating job heartbeat: {e}")
+
+    def _fail_overdue(self, job):
+        # The worker thread stays in its call, but the job is finished, so the
+        # chat can generate again; finish_job ignores the late result.
+        error = f"Job exceeded the {JOB_TIMEOUT_SECONDS:.0f}s time limit"
+        if finish_job(job, {"success": False, "error": error}):
+            print(f"Error running job {job['_id']}: {error}")
+
+
+_workers_lock = threading.Lock()
+_workers: Optional[JobWorker] = None
+
+
+def start_workers(concurrency: int = JOB_WORKERS) -> Optional[JobWorker]:
+    """Start this process's job workers once; with a concurrency of 0 it runs none."""
+    global _workers
+    with _workers_lock:
+        if _workers is None and concurrency > 0:
+            _workers = JobWorker(concurrency).start()
+    return _workers
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat() + "Z"
+    return str(value)
+
+
+def job_to_json(job) -> str:
+    return json.dumps(job, default=_json_default)
+
+
+class JobAPIHandler(BaseHTTPRequestHandler):
+    """JSON API over the jobs collection.
+
+    POST /jobs                 submit {"chat_id", "user_request", "platform"?, "source_id"?, "bypass_cache"?}
+    GET  /jobs?chat_id=N       the chat's latest jobs, without partial outputs
+    GET  /jobs/<id>            one job, polled by clients
+    GET  /jobs/<id>/events     server-sent events with the job on every change, until it finishes
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, body: str):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, message: str):
+        self._send_json(status, json.dumps({"error": message}))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        if parts == ["jobs"]:
+            chat_id = parse_qs(url.query).get("chat_id", [None])[0]
+            if chat_id is None or not chat_id.isdigit():
+                self._send_error(400, "chat_id query parameter is required")
+                return
+            self._send_json(200, job_to_json(list_jobs(int(chat_id))))
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = get_job(parts[1])
+            if job is None:
+                self._send_error(404, "job not found")
+                return
+            self._send_json(200, job_to_json(job))
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events":
+            self._stream_events(parts[1])
+        else:
+            self._send_error(404, "not found")
+
+    def _stream_events(self, job_id):
+        job = get_job(job_id)
+        if job is None:
+            self._send_error(404, "job not found")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        last_update = None
+        try:
+            while job is not None:
+                if job["updated_at"] != last_update:
+                    last_update = job["updated_at"]
+                    self.wfile.write(f"data: {job_to_json(job)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                if job["status"] in FINISHED_STATUSES:
+                    break
+                time.sleep(JOB_PROGRESS_INTERVAL / 2)
+                job = get_job(job_id)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/jobs":
+            self._send_error(404, "not found")
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            chat_id = int(request["chat_id"])
+            user_request = str(request["user_request"])
+        except (ValueError, KeyError, TypeError):
+            self._send_error(400, "chat_id and user_request are required")
+            return
+
+        chat = get_chat_info(chat_id)
+        if chat is None:
+            self._send_error(404, "chat not found")
+            return
+        source_id = request.get("source_id")
+        if source_id is not None and _object_id(source_id) is None:
+            self._send_error(400, "invalid source_id")
+            return
+        try:
+            job_id = submit_job(
+                chat_id,
+                request.get("platform") or chat.get("platform"),
+                user_request,
+                source_id=_object_id(source_id),
+                bypass_cache=bool(request.get("bypass_cache", False))
+            )
+        except ValueError as e:
+            self._send_error(400, str(e))
+            return
+        self._send_json(202, json.dumps({"job_id": str(job_id)}))
+
+
+def serve_api(port: int, host: str = JOB_API_HOST) -> ThreadingHTTPServer:
+    """Serve the job API from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), JobAPIHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="job-api", daemon=True).start()
+    return server
+
+
+_api_server = None
+
+
+def start_api():
+    """Serve the job API on JOB_API_PORT, if set, once per process."""
+    global _api_server
+    with _workers_lock:
+        if _api_server is None and JOB_API_PORT:
+            try:
+                _api_server = serve_api(int(JOB_API_PORT))
+            except OSError as e:
+                # Another process already serves the port.
+                print(f"Error starting job API: {e}")
+    return _api_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run generation job workers and the job API.")
+    parser.add_argument("--workers", type=int, default=max(JOB_WORKERS, 1), help="jobs run at once")
+    parser.add_argument("--port", type=int, default=int(JOB_API_PORT) if JOB_API_PORT else None,
+                        help="serve the job API on this port")
+    parser.add_argument("--host", default=JOB_API_HOST, help="interface the job API listens on")
+    args = parser.parse_args()
+
+    from MongoData import ensure_indexes, vector_store
+    from LLMClient import warm_up
+
+    ensure_indexes()
+    vector_store.warm_up()
+    warm_up()
+    if args.port:
+        serve_api(args.port, args.host)
+        print(f"Job API listening on {args.host}:{args.port}")
+    workers = JobWorker(args.workers).start()
+    print(f"Running {args.workers} job workers as {workers.worker_id}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("Stopping; waiting for running jobs to finish")
+        workers.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class LLMResponseCache:
+    """Content-addressed cache for LLM replies.
+
+    Entries are keyed by a hash of model, temperature, sampling params and the
+    full prompt. A bounded in-memory LRU sits in front of an optional SQLite
+    tier whose rows expire after ``ttl_seconds``.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        db_path: Optional[str] = None,
+        ttl_seconds: int = 7 * 24 * 3600
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0
+        }
+
+        self._db = None
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._db.execute(
+                    "DELETE FROM llm_cache WHERE created_at < ?",
+                    (time.time() - ttl_seconds,)
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Error opening LLM cache database: {e}")
+                self._db = None
+
+    @staticmethod
+    def make_key(model: str, temperature: float, params: Dict[str, Any], prompt: str) -> str:
+        payload = json.dumps(
+            {
+                "model": model,
+                "temperature": temperature,
+                "params": params,
+                "prompt": prompt
+            },
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return self._entries[key]
+
+            value = self._get_from_disk(key)
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+
+            self._stats["disk_hits"] += 1
+            self._remember(key, value)
+            return value
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            self._remember(key, value)
+            self._stats["stores"] += 1
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO llm_cache (key, value, created_at) VALUES (?, ?, ?)",
+                        (key, value, time.time())
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Error writing LLM cache entry: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            lookups = hits + self._stats["misses"]
+            return {
+                **self._stats,
+                "hits": hits,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "persistent": self._db is not None
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def _remember(self, key: str, value: str):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _get_from_disk(self, key: str) -> Optional[str]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time() - self.ttl_seconds:
+                self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            return row[0]
+        except sqlite3.Error as e:
+            print(f"Error reading LLM cache entry: {e}")
+            return None
+
+
+llm_cache = LLMResponseCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", "256")),
+    db_path=os.getenv("LLM_CACHE_DB"),
+    ttl_seconds=int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+)
@@ -0,0 +1,688 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+from Metrics import record_llm_queue
+
+if TYPE_CHECKING:
+    from langchain_ollama import ChatOllama
+
+DEFAULT_MODEL = "llama3.2"
+DEFAULT_TEMPERATURE = 0.7
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+# Comma-separated list of Ollama servers to spread requests over.
+OLLAMA_BASE_URLS = [
+    url.strip().rstrip("/")
+    for url in os.getenv("OLLAMA_BASE_URLS", OLLAMA_BASE_URL).split(",")
+    if url.strip()
+]
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+# Requests in flight across all backends; the rest wait in the scheduler's
+# priority queue for at most LLM_QUEUE_TIMEOUT seconds.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", str(4 * len(OLLAMA_BASE_URLS))))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "300"))
+QUEUE_POLL_INTERVAL = 0.25
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_GENERATION = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_GENERATION: "generation"}
+
+
+def _parse_keep_alive(value: Optional[str]):
+    # Ollama takes either seconds or a duration string such as "30m"; "-1"
+    # keeps the model loaded until the server stops.
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+OLLAMA_KEEP_ALIVE = _parse_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "30m"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "32"))
+
+# Ollama restarts the model runner whenever num_ctx changes, so every request
+# uses the smallest bucket, which fits every workflow node's prompt and reply
+# and is the size preload loads the model with. Only oversized prompts move up
+# instead of being silently truncated.
+NUM_CTX_BUCKETS = tuple(sorted(
+    int(size) for size in os.getenv("OLLAMA_NUM_CTX_BUCKETS", "8192,16384,32768").split(",")
+))
+CHARS_PER_TOKEN = 4
+# Default room left for the reply; callers expecting long replies pass their own.
+COMPLETION_TOKEN_RESERVE = 1024
+
+_lock = threading.RLock()
+_http_clients: Dict[str, Tuple[object, object]] = {}
+_llm_clients: Dict[tuple, "ChatOllama"] = {}
+# httpx async connections belong to the event loop that opened them, so each
+# loop gets its own AsyncClient per base URL and its own copies of the
+# clients it awaits on. Entries for closed loops are dropped on lookup.
+_loop_clients: Dict[asyncio.AbstractEventLoop, Dict[Any, Any]] = {}
+
+
+def get_http_clients(base_url: str = OLLAMA_BASE_URLS[0]):
+    """Return the (sync, async) Ollama clients shared by every model on base_url."""
+    clients = _http_clients.get(base_url)
+    if clients is None:
+        with _lock:
+            clients = _http_clients.get(base_url)
+            if clients is None:
+                import httpx
+                from ollama import AsyncClient, Client
+
+                limits = httpx.Limits(
+                    max_connections=OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=OLLAMA_MAX_CONNECTIONS
+                )
+                clients = (
+                    Client(host=base_url, limits=limits),
+                    AsyncClient(host=base_url, limits=limits)
+                )
+                _http_clients[base_url] = clients
+    return clients
+
+
+def _async_http_client(loop: asyncio.AbstractEventLoop, base_url: str):
+    clients = _loop_clients[loop]
+    client = clients.get(base_url)
+    if client is None:
+        import httpx
+        from ollama import AsyncClient
+
+        client = AsyncClient(host=base_url, limits=httpx.Limits(
+            max_connections=OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_MAX_CONNECTIONS
+        ))
+        clients[base_url] = client
+    return client
+
+
+def for_running_loop(llm: "ChatOllama") -> "ChatOllama":
+    """A copy of llm whose async client belongs to the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        for closed in [other for other in _loop_clients if other.is_closed()]:
+            del _loop_clients[closed]
+        clients = _loop_clients.setdefault(loop, {})
+        # Keyed by identity; the original is kept alongside so the id stays unique.
+        entry = clients.get(id(llm))
+        if entry is None:
+            bound = llm.model_copy()
+            bound._client = llm._client
+            bound._async_client = _async_http_client(loop, llm.base_url)
+            entry = clients[id(llm)] = (llm, bound)
+    return entry[1]
+
+
+def num_ctx_for(prompt: str, completion_tokens: int = COMPLETION_TOKEN_RESERVE) -> int:
+    needed = len(prompt) // CHARS_PER_TOKEN + completion_tokens
+    for size in NUM_CTX_BUCKETS:
+        if size >= needed:
+            return size
+    return NUM_CTX_BUCKETS[-1]
+
+
+def get_llm(
+    model: str = DEFAULT_MODEL,
+    temperature: float = DEFAULT_TEMPERATURE,
+    num_ctx: int = None,
+    base_url: str = OLLAMA_BASE_URLS[0]
+) -> "ChatOllama":
+    """Return the shared ChatOllama for this model, temperature and context size.
+
+    All clients for a base URL share one pooled HTTP connection set and send
+    the configured keep_alive, so the model stays loaded between requests.
+    """
+    num_ctx = num_ctx or NUM_CTX_BUCKETS[0]
+    key = (model, temperature, num_ctx, base_url)
+    llm = _llm_clients.get(key)
+    if llm is None:
+        with _lock:
+            llm = _llm_clients.get(key)
+            if llm is None:
+                from langchain_ollama import ChatOllama
+
+                llm = ChatOllama(
+                    model=model,
+                    temperature=temperature,
+                    num_ctx=num_ctx,
+                    keep_alive=OLLAMA_KEEP_ALIVE,
+                    base_url=base_url
+                )
+                llm._client, llm._async_client = get_http_clients(base_url)
+                _llm_clients[key] = llm
+    return llm
+
+
+def sized_llm(
+    llm: "ChatOllama",
+    prompt: str,
+    completion_tokens: int = COMPLETION_TOKEN_RESERVE
+) -> "ChatOllama":
+    """The client with the same model and temperature as llm, sized for prompt and reply."""
+    num_ctx = num_ctx_for(prompt, completion_tokens)
+    if llm.num_ctx == num_ctx:
+        return llm
+    return get_llm(llm.model, llm.temperature, num_ctx, llm.base_url)
+
+
+def preload(
+    models: Iterable[str] = (DEFAULT_MODEL,),
+    base_url: str = OLLAMA_BASE_URLS[0]
+) -> Dict[str, float]:
+    """Load each model into Ollama with the default context size; returns seconds per model.
+
+    A generate request without a prompt only loads the model, and with
+    keep_alive set it stays loaded for later requests.
+    """
+    client, _ = get_http_clients(base_url)
+    timings = {}
+    for model in models:
+        start = time.perf_counter()
+        try:
+            client.generate(
+                model=model,
+                keep_alive=OLLAMA_KEEP_ALIVE,
+                options={"num_ctx": NUM_CTX_BUCKETS[0]}
+            )
+        except Exception as e:
+            print(f"Error preloading model {model}: {e}")
+            continue
+        timings[model] = time.perf_counter() - start
+    return timings
+
+
+def warm_up(models: Iterable[str] = (DEFAULT_MODEL,), base_urls: Iterable[str] = None) -> threading.Thread:
+    """Preload models on every backend in a background thread."""
+    base_urls = tuple(base_urls or OLLAMA_BASE_URLS)
+
+    def load():
+        for base_url in base_urls:
+            preload(tuple(models), base_url)
+
+    thread = threading.Thread(target=load, name="llm-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+class Backend:
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.healthy = True
+        self.sessions = 0
+
+
+class OllamaRouter:
+    """Spreads LLM requests over several Ollama servers.
+
+    A request goes to the healthy backend with the fewest outstanding
+    requests, except that a session (a chat) sticks to the backend it used
+    last so Ollama can reuse its prompt cache. Backends are taken out of
+    rotation after ``max_failures`` connection failures in a row and brought
+    back by the background health check.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        health_interval: float = OLLAMA_HEALTH_INTERVAL,
+        max_failures: int = 2,
+        max_sessions: int = 10000
+    ):
+        if not urls:
+            raise ValueError("OllamaRouter needs at least one backend URL")
+        self.backends = [Backend(url) for url in urls]
+        self.health_interval = health_interval
+        self.max_failures = max_failures
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._health_thread = None
+
+    def acquire(self, session=None, exclude: Iterable[str] = ()) -> Backend:
+        self._start_health_checks()
+        with self._lock:
+            candidates = [b for b in self.backends if b.url not in exclude]
+            if not candidates:
+                raise ConnectionError("No Ollama backend left to try")
+            healthy = [b for b in candidates if b.healthy]
+            # With every backend marked down, trying one beats failing outright.
+            candidates = healthy or candidates
+
+            backend = None
+            if session is not None:
+                url = self._sessions.get(session)
+                backend = next((b for b in candidates if b.url == url), None)
+            if backend is None:
+                # New sessions also balance on how many sessions each backend
+                # already holds, since they will keep coming back to it.
+                load = lambda b: (b.outstanding, b.sessions)
+                fewest = min(load(b) for b in candidates)
+                backend = random.choice([b for b in candidates if load(b) == fewest])
+                if session is not None:
+                    self._assign(session, backend)
+            elif session is not None:
+                self._sessions.move_to_end(session)
+
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def _assign(self, session, backend: Backend):
+        previous = self._sessions.pop(session, None)
+        if previous is not None:
+            self._backend(previous).sessions -= 1
+        self._sessions[session] = backend.url
+        backend.sessions += 1
+        if len(self._sessions) > self.max_sessions:
+            _, url = self._sessions.popitem(last=False)
+            self._backend(url).sessions -= 1
+
+    def _backend(self, url: str) -> Backend:
+        return next(b for b in self.backends if b.url == url)
+
+    def release(self, backend: Backend, failed: bool = False):
+        with self._lock:
+            backend.outstanding -= 1
+            if failed:
+                backend.failures += 1
+                backend.consecutive_failures += 1
+                if backend.consecutive_failures >= self.max_failures:
+                    backend.healthy = False
+            else:
+                backend.consecutive_failures = 0
+
+    def check_health(self):
+        import httpx
+
+        for backend in self.backends:
+            try:
+                httpx.get(f"{backend.url}/api/version", timeout=2.0).raise_for_status()
+                ok = True
+            except Exception:
+                ok = False
+            with self._lock:
+                backend.healthy = ok
+                if ok:
+                    backend.consecutive_failures = 0
+
+    def _start_health_checks(self):
+        if self._health_thread is not None or len(self.backends) == 1:
+            return
+        with self._lock:
+            if self._health_thread is not None:
+                return
+
+            def run():
+                while True:
+                    time.sleep(self.health_interval)
+                    self.check_health()
+
+            self._health_thread = threading.Thread(target=run, name="ollama-health", daemon=True)
+            self._health_thread.start()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "url": b.url,
+                    "healthy": b.healthy,
+                    "outstanding": b.outstanding,
+                    "requests": b.requests,
+                    "failures": b.failures,
+                    "sessions": b.sessions
+                }
+                for b in self.backends
+            ]
+
+
+router = OllamaRouter(OLLAMA_BASE_URLS)
+
+
+class QueueTimeout(TimeoutError):
+    pass
+
+
+class Ticket:
+    """A request's place in the LLMScheduler queue.
+
+    Wait for it with wait()/wait_async() or queued_positions(), and always
+    release() it, whether or not it was granted.
+    """
+
+    def __init__(self, scheduler: "LLMScheduler", priority: int, sequence: int):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.key = (priority, sequence)
+        self.enqueued_at = time.monotonic()
+        self.deadline = self.enqueued_at + scheduler.max_wait
+        self.granted_at = None
+        self.released = False
+        self._granted = threading.Event()
+        self._futures = []
+
+    @property
+    def granted(self) -> bool:
+        return self._granted.is_set()
+
+    @property
+    def position(self) -> int:
+        """1-based place among the waiting requests, 0 once granted."""
+        return self.scheduler.position(self)
+
+    def _grant(self):
+        # Called with the scheduler lock held.
+        self.granted_at = time.monotonic()
+        self._granted.set()
+        for loop, future in self._futures:
+            loop.call_soon_threadsafe(_resolve, future)
+        self._futures.clear()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block up to timeout seconds for a slot; raises QueueTimeout past the deadline."""
+        remaining = max(self.deadline - time.monotonic(), 0.0)
+        if self._granted.wait(remaining if timeout is None else min(timeout, remaining)):
+            return True
+        if time.monotonic() >= self.deadline:
+            self.scheduler._expire(self)
+            return True
+        return False
+
+    async def wait_async(self, timeout: float = None) -> bool:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self.scheduler._add_future(self, loop, future):
+            return True
+        remaining = max(self.deadline - time.monotonic(), 0.0)
+        try:
+            await asyncio.wait_for(future, remaining if timeout is None else min(timeout, remaining))
+            return True
+        except asyncio.TimeoutError:
+            self.scheduler._remove_future(self, future)
+        if time.monotonic() >= self.deadline:
+            self.scheduler._expire(self)
+            return True
+        return False
+
+    def queued_positions(self):
+        """Wait for a slot, yielding the queue position each time it changes."""
+        last = 0
+        while not self.granted:
+            position = self.position
+            if position and position != last:
+                yield position
+                last = position
+            self.wait(QUEUE_POLL_INTERVAL)
+
+    def release(self):
+        self.scheduler.release(self)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class LLMScheduler:
+    """Process-wide admission control for LLM requests.
+
+    At most ``max_concurrency`` requests are sent to Ollama at once. The rest
+    wait in a priority queue, FIFO within a priority, so a chat reply goes
+    ahead of queued generation stages instead of behind them. A request that
+    waits longer than ``max_wait`` seconds fails with QueueTimeout rather than
+    hanging. Each release records the request's queue wait and service time.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, max_wait: float = LLM_QUEUE_TIMEOUT):
+        if max_concurrency < 1:
+            raise ValueError("LLMScheduler needs a concurrency of at least 1")
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.running = 0
+        self.admitted = 0
+        self.timed_out = 0
+        self._queue = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def enter(self, priority: int = PRIORITY_GENERATION) -> Ticket:
+        with self._lock:
+            ticket = Ticket(self, priority, next(self._sequence))
+            heapq.heappush(self._queue, (ticket.key, ticket))
+            self._dispatch()
+        return ticket
+
+    def _dispatch(self):
+        while self._queue and self.running < self.max_concurrency:
+            _, ticket = heapq.heappop(self._queue)
+            self.running += 1
+            self.admitted += 1
+            ticket._grant()
+
+    def position(self, ticket: Ticket) -> int:
+        with self._lock:
+            if ticket.granted:
+                return 0
+            return 1 + sum(1 for key, _ in self._queue if key < ticket.key)
+
+    def _remove(self, ticket: Ticket) -> bool:
+        for i, (_, queued) in enumerate(self._queue):
+            if queued is ticket:
+                self._queue.pop(i)
+                heapq.heapify(self._queue)
+                return True
+        return False
+
+    def _expire(self, ticket: Ticket):
+        with self._lock:
+            if ticket.granted:
+                return
+            position = 1 + sum(1 for key, _ in self._queue if key < ticket.key)
+            self._remove(ticket)
+            ticket.released = True
+            self.timed_out += 1
+        raise QueueTimeout(
+            f"LLM request waited {self.max_wait:g}s in the queue (still at position {position})"
+        )
+
+    def _add_future(self, ticket: Ticket, loop, future) -> bool:
+        """Register future to be resolved on grant; False if already granted."""
+        with self._lock:
+            if ticket.granted:
+                return False
+            ticket._futures.append((loop, future))
+            return True
+
+    def _remove_future(self, ticket: Ticket, future):
+        with self._lock:
+            ticket._futures = [entry for entry in ticket._futures if entry[1] is not future]
+
+    def release(self, ticket: Ticket):
+        """Free the ticket's slot, or leave the queue if it was never granted."""
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            if not ticket.granted:
+                self._remove(ticket)
+                return
+            self.running -= 1
+            self._dispatch()
+        record_llm_queue(
+            PRIORITY_NAMES.get(ticket.priority, str(ticket.priority)),
+            ticket.granted_at - ticket.enqueued_at,
+            time.monotonic() - ticket.granted_at
+        )
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_GENERATION, on_queued: Callable[[int], None] = None):
+        """Hold a slot for the block; on_queued(position) is called while waiting."""
+        ticket = self.enter(priority)
+        try:
+            for position in ticket.queued_positions():
+                if on_queued:
+                    on_queued(position)
+            yield ticket
+        finally:
+            ticket.release()
+
+    @asynccontextmanager
+    async def aslot(self, priority: int = PRIORITY_GENERATION, on_queued: Callable[[int], None] = None):
+        ticket = self.enter(priority)
+        try:
+            last = 0
+            while not ticket.granted:
+                position = ticket.position
+                if on_queued and position and position != last:
+                    on_queued(position)
+                    last = position
+                await ticket.wait_async(QUEUE_POLL_INTERVAL)
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waiting = {}
+            for (priority, _), _ticket in self._queue:
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                waiting[name] = waiting.get(name, 0) + 1
+            return {
+                "max_concurrency": self.max_concurrency,
+                "running": self.running,
+                "waiting": waiting,
+                "admitted": self.admitted,
+                "timed_out": self.timed_out
+            }
+
+
+scheduler = LLMScheduler()
+
+
+def _connection_errors():
+    import httpx
+    return (ConnectionError, httpx.TransportError)
+
+
+def _on_backend(llm: "ChatOllama", backend: Backend) -> "ChatOllama":
+    if llm.base_url == backend.url:
+        return llm
+    return get_llm(llm.model, llm.temperature, llm.num_ctx, backend.url)
+
+
+def routed_invoke(
+    llm: "ChatOllama",
+    messages,
+    session=None,
+    priority: int = PRIORITY_GENERATION,
+    on_queued: Callable[[int], None] = None
+):
+    """llm.invoke on a backend chosen by the router, failing over on connection errors.
+
+    The request first waits for a scheduler slot at ``priority``.
+    """
+    with scheduler.slot(priority, on_queued):
+        tried = []
+        while True:
+            backend = router.acquire(session, exclude=tried)
+            try:
+                response = _on_backend(llm, backend).invoke(messages)
+            except _connection_errors():
+                router.release(backend, failed=True)
+                tried.append(backend.url)
+                if len(tried) == len(router.backends):
+                    raise
+                continue
+            except BaseException:
+                router.release(backend)
+                raise
+            router.release(backend)
+            return response
+
+
+async def routed_ainvoke(
+    llm: "ChatOllama",
+    messages,
+    session=None,
+    priority: int = PRIORITY_GENERATION,
+    on_queued: Callable[[int], None] = None
+):
+    async with scheduler.aslot(priority, on_queued):
+        tried = []
+        while True:
+            backend = router.acquire(session, exclude=tried)
+            try:
+                response = await for_running_loop(_on_backend(llm, backend)).ainvoke(messages)
+            except _connection_errors():
+                router.release(backend, failed=True)
+                tried.append(backend.url)
+                if len(tried) == len(router.backends):
+                    raise
+                continue
+            except BaseException:
+                router.release(backend)
+                raise
+            router.release(backend)
+            return response
+
+
+def routed_stream(
+    llm: "ChatOllama",
+    messages,
+    session=None,
+    priority: int = PRIORITY_GENERATION,
+    ticket: Ticket = None
+):
+    """llm.stream on a routed backend; fails over only before the first chunk.
+
+    Pass a granted ``ticket`` when the caller waited for the slot itself (to
+    report its queue position); the caller then releases it. Otherwise the
+    stream takes a slot at ``priority`` and frees it when done.
+    """
+    owned = ticket is None
+    if owned:
+        ticket = scheduler.enter(priority)
+    try:
+        ticket.wait()
+        tried = []
+        while True:
+            backend = router.acquire(session, exclude=tried)
+            started = False
+            try:
+                for chunk in _on_backend(llm, backend).stream(messages):
+                    started = True
+                    yield chunk
+            except _connection_errors():
+                router.release(backend, failed=True)
+                tried.append(backend.url)
+                if started or len(tried) == len(router.backends):
+                    raise
+                continue
+            except BaseException:
+                router.release(backend)
+                raise
+            router.release(backend)
+            return
+    finally:
+        if owned:
+            ticket.release()
+
+
+def clear_clients():
+    with _lock:
+        _llm_clients.clear()
+        _http_clients.clear()
+        _loop_clients.clear()
@@ -0,0 +1,399 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# (RunMetrics, stage name) for the stage currently executing in this context.
+# Nodes set it from their run config, so it follows the work into LangGraph's
+# worker threads and into asyncio.to_thread.
+_active_stage = contextvars.ContextVar("active_stage", default=None)
+
+_NANOSECONDS = 1e9
+
+
+def _new_stage(name: str) -> Dict[str, Any]:
+    return {
+        "stage": name,
+        "wall_s": 0.0,
+        "llm_calls": 0,
+        "cache_hits": 0,
+        "prompt_chars": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "prompt_eval_s": 0.0,
+        "eval_s": 0.0,
+        "queue_wait_s": 0.0,
+        "llm_service_s": 0.0,
+        "vector_store": {}
+    }
+
+
+class RunMetrics:
+    """Per-run collector for stage wall time, LLM usage and vector store calls.
+
+    A run is one generation or chat reply. Pass it to the graph through
+    ``config["configurable"]["metrics"]``; nodes and helpers record into it
+    while their stage is active, and ``finish_run`` returns the summary and
+    sends it to the configured sinks.
+    """
+
+    def __init__(self, workflow: str):
+        self.workflow = workflow
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = datetime.utcnow()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stages = OrderedDict()
+
+    def _stage(self, name: str) -> Dict[str, Any]:
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = _new_stage(name)
+        return stage
+
+    @contextmanager
+    def stage(self, name: str):
+        token = _active_stage.set((self, name))
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            _active_stage.reset(token)
+            self.add_wall_time(name, time.perf_counter() - start)
+
+    def add_wall_time(self, stage: str, seconds: float):
+        with self._lock:
+            self._stage(stage)["wall_s"] += seconds
+
+    def add_llm_call(self, stage: str, stats: Dict[str, Any]):
+        with self._lock:
+            entry = self._stage(stage)
+            entry["llm_calls"] += 1
+            entry["cache_hits"] += stats["cached"]
+            entry["prompt_chars"] += stats["prompt_chars"]
+            entry["prompt_tokens"] += stats["prompt_tokens"]
+            entry["completion_tokens"] += stats["completion_tokens"]
+            entry["prompt_eval_s"] += stats["prompt_eval_s"]
+            entry["eval_s"] += stats["eval_s"]
+
+    def add_queue_time(self, stage: str, wait_seconds: float, service_seconds: float):
+        with self._lock:
+            entry = self._stage(stage)
+            entry["queue_wait_s"] += wait_seconds
+            entry["llm_service_s"] += service_seconds
+
+    def add_operation(self, stage: str, operation: str, seconds: float):
+        with self._lock:
+            calls = self._stage(stage)["vector_store"].setdefault(
+                operation, {"calls": 0, "wall_s": 0.0}
+            )
+            calls["calls"] += 1
+            calls["wall_s"] += seconds
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = [
+                dict(stage, vector_store={op: dict(calls) for op, calls in stage["vector_store"].items()})
+                for stage in self._stages.values()
+            ]
+        return {
+            "run_id": self.run_id,
+            "workflow": self.workflow,
+            "started_at": self.started_at.isoformat() + "Z",
+            "total_s": time.perf_counter() - self._start,
+            "stages": stages
+        }
+
+
+def run_metrics_from(config) -> Optional[RunMetrics]:
+    return (config or {}).get("configurable", {}).get("metrics")
+
+
+@contextmanager
+def run_stage(config, name: str):
+    """Time ``name`` for the run in ``config``, if it carries a collector."""
+    metrics = run_metrics_from(config)
+    if metrics is None:
+        yield None
+        return
+    with metrics.stage(name):
+        yield metrics
+
+
+def _labels() -> Dict[str, str]:
+    active = _active_stage.get()
+    if active is None:
+        return {"workflow": "none", "stage": "none"}
+    metrics, stage_name = active
+    return {"workflow": metrics.workflow, "stage": stage_name}
+
+
+def record_llm_call(model: str, prompt: str, response=None, cached: bool = False):
+    """Record one LLM call; ``response`` is the AIMessage (or merged chunk) Ollama returned."""
+    metadata = getattr(response, "response_metadata", None) or {}
+    stats = {
+        "model": model,
+        "cached": cached,
+        "prompt_chars": len(prompt),
+        "prompt_tokens": metadata.get("prompt_eval_count") or 0,
+        "completion_tokens": metadata.get("eval_count") or 0,
+        "prompt_eval_s": (metadata.get("prompt_eval_duration") or 0) / _NANOSECONDS,
+        "eval_s": (metadata.get("eval_duration") or 0) / _NANOSECONDS
+    }
+
+    active = _active_stage.get()
+    if active is not None:
+        metrics, stage_name = active
+        metrics.add_llm_call(stage_name, stats)
+
+    labels = _labels()
+    for sink in get_sinks():
+        try:
+            sink.observe_llm_call(labels, stats)
+        except Exception as e:
+            print(f"Error recording LLM metrics: {e}")
+
+
+def record_llm_queue(priority: str, wait_seconds: float, service_seconds: float):
+    """Record how long an LLM request waited for a scheduler slot and then held it."""
+    active = _active_stage.get()
+    if active is not None:
+        metrics, stage_name = active
+        metrics.add_queue_time(stage_name, wait_seconds, service_seconds)
+
+    labels = _labels()
+    for sink in get_sinks():
+        try:
+            sink.observe_llm_queue(labels, priority, wait_seconds, service_seconds)
+        except Exception as e:
+            print(f"Error recording queue metrics: {e}")
+
+
+def record_operation(operation: str, seconds: float):
+    active = _active_stage.get()
+    if active is not None:
+        metrics, stage_name = active
+        metrics.add_operation(stage_name, operation, seconds)
+
+    for sink in get_sinks():
+        try:
+            sink.observe_operation(operation, seconds)
+        except Exception as e:
+            print(f"Error recording operation metrics: {e}")
+
+
+def timed_operation(operation: str):
+    """Decorator recording the wall time of every call as ``operation``."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record_operation(operation, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def finish_run(metrics: Optional[RunMetrics]) -> Optional[Dict[str, Any]]:
+    if metrics is None:
+        return None
+    summary = metrics.summary()
+    for sink in get_sinks():
+        try:
+            sink.emit(summary)
+        except Exception as e:
+            print(f"Error exporting run metrics: {e}")
+    return summary
+
+
+class MetricsSink:
+    """Base sink; override the hooks you need."""
+
+    def emit(self, summary: Dict[str, Any]):
+        pass
+
+    def observe_llm_call(self, labels: Dict[str, str], stats: Dict[str, Any]):
+        pass
+
+    def observe_llm_queue(self, labels: Dict[str, str], priority: str, wait_seconds: float, service_seconds: float):
+        pass
+
+    def observe_operation(self, operation: str, seconds: float):
+        pass
+
+
+class JsonlSink(MetricsSink):
+    """Appends one JSON line per finished run."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, summary: Dict[str, Any]):
+        line = json.dumps(summary)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class PrometheusSink(MetricsSink):
+    """Aggregates counters in memory and renders the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = OrderedDict()
+        self._server = None
+
+    _HELP = {
+        "workflow_runs_total": ("counter", "Finished workflow runs."),
+        "workflow_run_seconds": ("summary", "Wall time of whole runs."),
+        "workflow_stage_seconds": ("summary", "Wall time spent in each stage."),
+        "llm_calls_total": ("counter", "LLM calls, including response cache hits."),
+        "llm_prompt_chars_total": ("counter", "Prompt characters sent to the LLM."),
+        "llm_prompt_tokens_total": ("counter", "Prompt tokens reported by Ollama."),
+        "llm_completion_tokens_total": ("counter", "Completion tokens reported by Ollama."),
+        "llm_prompt_eval_seconds_total": ("counter", "Ollama prompt evaluation time."),
+        "llm_eval_seconds_total": ("counter", "Ollama generation time."),
+        "llm_queue_wait_seconds": ("summary", "Time LLM requests waited for a scheduler slot."),
+        "llm_service_seconds": ("summary", "Time LLM requests held a scheduler slot."),
+        "vector_store_seconds": ("summary", "Wall time of vector store operations."),
+    }
+
+    def _add(self, name: str, labels: Dict[str, str], value: float):
+        key = (name, tuple(sorted(labels.items())))
+        self._series[key] = self._series.get(key, 0) + value
+
+    def _observe(self, name: str, labels: Dict[str, str], seconds: float):
+        self._add(name + "_sum", labels, seconds)
+        self._add(name + "_count", labels, 1)
+
+    def emit(self, summary: Dict[str, Any]):
+        workflow = {"workflow": summary["workflow"]}
+        with self._lock:
+            self._add("workflow_runs_total", workflow, 1)
+            self._observe("workflow_run_seconds", workflow, summary["total_s"])
+            for stage in summary["stages"]:
+                self._observe(
+                    "workflow_stage_seconds",
+                    dict(workflow, stage=stage["stage"]),
+                    stage["wall_s"]
+                )
+
+    def observe_llm_call(self, labels: Dict[str, str], stats: Dict[str, Any]):
+        labels = dict(labels, model=stats["model"])
+        with self._lock:
+            self._add("llm_calls_total", dict(labels, cached=str(stats["cached"]).lower()), 1)
+            self._add("llm_prompt_chars_total", labels, stats["prompt_chars"])
+            self._add("llm_prompt_tokens_total", labels, stats["prompt_tokens"])
+            self._add("llm_completion_tokens_total", labels, stats["completion_tokens"])
+            self._add("llm_prompt_eval_seconds_total", labels, stats["prompt_eval_s"])
+            self._add("llm_eval_seconds_total", labels, stats["eval_s"])
+
+    def observe_llm_queue(self, labels: Dict[str, str], priority: str, wait_seconds: float, service_seconds: float):
+        labels = {"workflow": labels["workflow"], "priority": priority}
+        with self._lock:
+            self._observe("llm_queue_wait_seconds", labels, wait_seconds)
+            self._observe("llm_service_seconds", labels, service_seconds)
+
+    def observe_operation(self, operation: str, seconds: float):
+        with self._lock:
+            self._observe("vector_store_seconds", {"operation": operation}, seconds)
+
+    def render(self) -> str:
+        with self._lock:
+            series = list(self._series.items())
+
+        # The text format needs every sample of a family in one group, but
+        # series are created in first-use order across families.
+        families = OrderedDict()
+        for (name, labels), value in series:
+            family = name
+            for suffix in ("_sum", "_count"):
+                if name.endswith(suffix) and name[:-len(suffix)] in self._HELP:
+                    family = name[:-len(suffix)]
+            families.setdefault(family, []).append((name, labels, value))
+
+        lines = []
+        for family, samples in families.items():
+            if family in self._HELP:
+                metric_type, help_text = self._HELP[family]
+                lines.append(f"# HELP {family} {help_text}")
+                lines.append(f"# TYPE {family} {metric_type}")
+            for name, labels, value in samples:
+                label_text = ",".join(f'{key}="{_escape_label(val)}"' for key, val in labels)
+                lines.append(f"{name}{{{label_text}}} {value:g}" if label_text else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Expose render() at http://host:port/metrics from a daemon thread."""
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = sink.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever, name="metrics-http", daemon=True
+        ).start()
+        return self._server
+
+
+_sinks_lock = threading.Lock()
+_sinks: Optional[List[MetricsSink]] = None
+
+
+def get_sinks() -> List[MetricsSink]:
+    """Sinks configured from METRICS_JSONL and METRICS_PROMETHEUS_PORT/_HOST, created on first use."""
+    global _sinks
+    if _sinks is None:
+        with _sinks_lock:
+            if _sinks is None:
+                sinks = []
+                if os.getenv("METRICS_JSONL"):
+                    sinks.append(JsonlSink(os.getenv("METRICS_JSONL")))
+                if os.getenv("METRICS_PROMETHEUS_PORT"):
+                    prometheus = PrometheusSink()
+                    try:
+                        prometheus.serve(
+                            int(os.getenv("METRICS_PROMETHEUS_PORT")),
+                            os.getenv("METRICS_PROMETHEUS_HOST", "127.0.0.1")
+                        )
+                    except OSError as e:
+                        # Another worker process already serves the port.
+                        print(f"Error starting metrics endpoint: {e}")
+                    sinks.append(prometheus)
+                _sinks = sinks
+    return _sinks
+
+
+def add_sink(sink: MetricsSink):
+    sinks = get_sinks()
+    with _sinks_lock:
+        sinks.append(sink)
@@ -1,22 +1,201 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import gridfs
 from datetime import datetime
 import os
+import re
+import zlib
+import time
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any
 
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
+from Extraction import chunk_text
+from LLMCache import LLMResponseCache
+from Metrics import timed_operation
 
 client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
-DB_name = "socialmedia_app"
+DB_name = os.getenv("MONGO_DB", "socialmedia_app")
 db = client[DB_name]
 chats_collection = db["chats"]
 messages_collection = db["messages"]
+counters_collection = db["counters"]
+sources_collection = db["sources"]
+jobs_collection = db["jobs"]
+summaries_collection = db["summaries"]
+source_files = gridfs.GridFS(db, collection="source_files")
 
+# Compressed sources above this size go to GridFS instead of the document.
+INLINE_SOURCE_LIMIT = 4 * 1024 * 1024
+SOURCE_READ_BLOCK = 64 * 1024
+SOURCE_CHUNK_CHARS = 1000
+SOURCE_CHUNK_OVERLAP = 100
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+
+def ensure_indexes():
+    # create_index is a no-op when an identical index already exists, so this
+    # is safe to run on every process start.
+    messages_collection.create_index(
+        [("chat_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)],
+        name="chat_id_timestamp_id"
+    )
+    messages_collection.create_index(
+        [("chat_id", ASCENDING), ("_id", ASCENDING)],
+        name="chat_id_id"
+    )
+    messages_collection.create_index(
+        [("chat_id", ASCENDING), ("timestamp", DESCENDING)],
+        name="chat_id_extracted_content",
+        partialFilterExpression={"extracted_content": {"$exists": True}}
+    )
+    # Walks chats in sidebar order and applies the name prefix and platform
+    # filters to index keys, so a page reads only the documents it returns.
+    chats_collection.create_index(
+        [("updated_at", DESCENDING), ("_id", DESCENDING), ("chat_name", ASCENDING), ("platform", ASCENDING)],
+        name="updated_at_id_chat_name_platform"
+    )
+    chats_collection.create_index(
+        [("platform", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)],
+        name="platform_updated_at_id"
+    )
+    sources_collection.create_index(
+        [("chat_id", ASCENDING)],
+        name="chat_id"
+    )
+    # Workers claim the oldest queued job; the UI looks up a chat's latest job.
+    jobs_collection.create_index(
+        [("status", ASCENDING), ("created_at", ASCENDING)],
+        name="status_created_at"
+    )
+    jobs_collection.create_index(
+        [("chat_id", ASCENDING), ("created_at", DESCENDING)],
+        name="chat_id_created_at"
+    )
+
+
+def _seed_chat_id_counter():
+    # Older deployments allocated ids by counting chats, so start the counter
+    # past the highest id already in use.
+    last_chat = chats_collection.find_one({}, {"_id": 1}, sort=[("_id", DESCENDING)])
+    try:
+        counters_collection.insert_one({
+            "_id": "chat_id",
+            "seq": last_chat["_id"] if last_chat else 0
+        })
+    except DuplicateKeyError:
+        pass
 
 def get_next_chat_id():
-    count = chats_collection.count_documents({})
-    return count + 1
+    counter = counters_collection.find_one_and_update(
+        {"_id": "chat_id"},
+        {"$inc": {"seq": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if counter is None:
+        _seed_chat_id_counter()
+        return get_next_chat_id()
+    return counter["seq"]
+
+class ChatMetadataCache:
+    """Process-wide cache for chat documents and sidebar chat listings.
+
+    Every Streamlit rerun reads the same metadata, so reads are served from
+    memory until a write in this process invalidates them. The TTL bounds
+    how stale an entry can get when another process writes the chat.
+    """
+    
+    def __init__(self, ttl_seconds: float = 30.0):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._chats = {}
+        self._chat_lists = {}
+    
+    def get_chat(self, chat_id, load):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._chats.get(chat_id)
+            if entry and entry[0] > now:
+                return dict(entry[1]) if entry[1] else None
+        
+        chat = load(chat_id)
+        with self._lock:
+            self._chats[chat_id] = (now + self.ttl_seconds, chat)
+        return dict(chat) if chat else None
+    
+    def get_chat_list(self, key, load):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._chat_lists.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+        
+        result = load()
+        with self._lock:
+            self._chat_lists[key] = (now + self.ttl_seconds, result)
+        return result
+    
+    def invalidate(self, chat_id=None):
+        # Any change to a chat can reorder or relabel the sidebar list.
+        with self._lock:
+            if chat_id is not None:
+                self._chats.pop(chat_id, None)
+            self._chat_lists.clear()
+    
+    def clear(self):
+        with self._lock:
+            self._chats.clear()
+            self._chat_lists.clear()
+
+
+chat_cache = ChatMetadataCache(ttl_seconds=float(os.getenv("CHAT_CACHE_TTL", 30)))
+
+
+class SummaryStore:
+    """Source chunk summaries keyed by the LLM cache key of their prompt.
+
+    A long source has hundreds of chunks, more than the shared response LRU
+    holds, so summaries get their own larger LRU in front of the summaries
+    collection. Keys depend only on the model settings and the chunk text,
+    so entries are shared across chats and never go stale.
+    """
+    
+    def __init__(self, max_entries: int = 4096):
+        self._memory = LLMResponseCache(max_entries=max_entries)
+    
+    def get(self, key: str):
+        summary = self._memory.get(key)
+        if summary is not None:
+            return summary
+        try:
+            doc = summaries_collection.find_one({"_id": key}, {"summary": 1})
+        except Exception as e:
+            print(f"Error reading summary: {e}")
+            return None
+        if doc is None:
+            return None
+        self._memory.put(key, doc["summary"])
+        return doc["summary"]
+    
+    def put(self, key: str, summary: str):
+        self._memory.put(key, summary)
+        try:
+            summaries_collection.update_one(
+                {"_id": key},
+                {"$set": {"summary": summary, "created_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            print(f"Error saving summary: {e}")
+    
+    def stats(self):
+        return self._memory.stats()
+
+
+summary_store = SummaryStore(max_entries=int(os.getenv("SUMMARY_CACHE_SIZE", "4096")))
+
 
 def create_new_chat(chat_name, platform="LinkedIn"):
     chat_id = get_next_chat_id()
@@ -28,8 +207,93 @@ def create_new_chat(chat_name, platform="LinkedIn"):
         "updated_at": datetime.utcnow()
     }
     chats_collection.insert_one(chat_data)
+    chat_cache.invalidate(chat_id)
     return chat_id
 
+def save_source(chat_id, name, text):
+    compressed = zlib.compress((text or "").encode("utf-8"))
+    source_data = {
+        "chat_id": chat_id,
+        "name": name,
+        "length": len(text or ""),
+        "compression": "zlib",
+        "created_at": datetime.utcnow()
+    }
+    if len(compressed) > INLINE_SOURCE_LIMIT:
+        source_data["file_id"] = source_files.put(compressed, filename=name)
+    else:
+        source_data["data"] = compressed
+    
+    source_id = sources_collection.insert_one(source_data).inserted_id
+    # Embedding every chunk takes seconds for a long document, so it happens
+    # on the indexing worker; generation indexes it first if it gets there first.
+    indexing_queue.submit_source(chat_id, source_id)
+    
+    chats_collection.update_one(
+        {"_id": chat_id},
+        {"$set": {"active_source_id": source_id}}
+    )
+    chat_cache.invalidate(chat_id)
+    return source_id
+
+def _read_source_text(source, max_chars=None):
+    if max_chars is None:
+        if "file_id" in source:
+            compressed = source_files.get(source["file_id"]).read()
+        else:
+            compressed = source["data"]
+        return zlib.decompress(compressed).decode("utf-8")
+    
+    # Inflate only as much as the prefix needs: at most four bytes a character.
+    limit = 4 * max_chars
+    if "file_id" in source:
+        stream = source_files.get(source["file_id"])
+        blocks = iter(lambda: stream.read(SOURCE_READ_BLOCK), b"")
+    else:
+        blocks = [source["data"]]
+    inflater = zlib.decompressobj()
+    data = b""
+    for block in blocks:
+        data += inflater.decompress(block, limit - len(data))
+        if len(data) >= limit:
+            break
+    return data.decode("utf-8", errors="ignore")[:max_chars]
+
+def get_source_text(source_id, max_chars=None):
+    """The source's text, or only its first max_chars characters."""
+    source = sources_collection.find_one({"_id": source_id})
+    return _read_source_text(source, max_chars) if source else None
+
+def get_active_source(chat_id):
+    """The chat's current source as {"_id", "name"}, without reading its text.
+
+    Chats from before the sources store get {"_id": None, "name", "message_id"}
+    pointing at the message holding the text. Read it with read_source_text.
+    """
+    chat = get_chat_info(chat_id)
+    if chat and chat.get("active_source_id"):
+        source = sources_collection.find_one({"_id": chat["active_source_id"]}, {"name": 1, "length": 1})
+        if source:
+            return {"_id": source["_id"], "name": source["name"]} if source.get("length") else None
+    
+    # Chats created before the sources store kept the text on the message.
+    legacy = messages_collection.find_one(
+        {"chat_id": chat_id, "extracted_content": {"$exists": True, "$nin": [None, ""]}},
+        {"source": 1},
+        sort=[("timestamp", DESCENDING)]
+    )
+    if legacy:
+        return {"_id": None, "name": legacy.get("source"), "message_id": legacy["_id"]}
+    return None
+
+def read_source_text(source, max_chars=None):
+    """Text of a source from get_active_source, or only its first max_chars characters."""
+    if source["_id"] is not None:
+        return get_source_text(source["_id"], max_chars)
+    message = messages_collection.find_one({"_id": source["message_id"]}, {"extracted_content": 1})
+    text = message.get("extracted_content") if message else None
+    return text[:max_chars] if text and max_chars is not None else text
+
 def save_message(chat_id, role, content, platform=None, source=None, extracted_content=None):
     message_data = {
         "chat_id": chat_id,
@@ -41,68 +305,327 @@ def save_message(chat_id, role, content, platform=None, source=None, extracted_c
         message_data["platform"] = platform
     if source:
         message_data["source"] = source
-        message_data["extracted_content"] = extracted_content
+        message_data["source_id"] = save_source(chat_id, source, extracted_content)
     
     result = messages_collection.insert_one(message_data)
     
-    vector_store.add_message_to_store(
-        chat_id=chat_id,
-        message_id=str(result.inserted_id),
-        role=role,
-        content=content
-    )
-  
-    chats_collection.update_one(
-        {"_id": chat_id}, 
-        {"$set": {"updated_at": datetime.utcnow()}}
-    )
+    # Embedding, Chroma indexing and the updated_at touch happen on the
+    # write-behind worker; the Mongo insert above is the durable write.
+    indexing_queue.submit(chat_id, {
+        "message_id": str(result.inserted_id),
+        "role": role,
+        "content": content,
+        "timestamp": message_data["timestamp"]
+    })
+    
+    return message_data
+
+def save_messages(chat_id, messages):
+    """Save several messages (dicts with role, content and optional platform) at once.
+
+    One insert_many, and a single queued batch for the embedding, Chroma and
+    updated_at side effects. Returns the stored messages in order.
+    """
+    if not messages:
+        return []
+    
+    timestamp = datetime.utcnow()
+    message_docs = []
+    for message in messages:
+        message_data = {
+            "chat_id": chat_id,
+            "role": message["role"],
+            "content": message["content"],
+            "timestamp": timestamp
+        }
+        if message.get("platform"):
+            message_data["platform"] = message["platform"]
+        message_docs.append(message_data)
+    
+    result = messages_collection.insert_many(message_docs, ordered=True)
+    
+    indexing_queue.submit_many(chat_id, [
+        {
+            "message_id": str(message_id),
+            "role": message_data["role"],
+            "content": message_data["content"],
+            "timestamp": timestamp
+        }
+        for message_id, message_data in zip(result.inserted_ids, message_docs)
+    ])
+    
+    return message_docs
+
+CHAT_LIST_PROJECTION = {"_id": 1, "chat_name": 1, "platform": 1, "updated_at": 1}
 
 def get_all_chats():
-    return list(chats_collection.find(
+    return [dict(chat) for chat in chat_cache.get_chat_list(("all",), lambda: list(chats_collection.find(
         {}, 
-        {"_id": 1, "chat_name": 1, "platform": 1, "updated_at": 1}
-    ).sort("updated_at", -1))
+        CHAT_LIST_PROJECTION
+    ).sort("updated_at", -1)))]
+
+def list_chats(search=None, platform=None, before=None, limit=30):
+    """Return one page of chats, most recently updated first.
+
+    ``search`` is a case-insensitive prefix of the chat name and ``before``
+    is the cursor returned with the previous page. Returns
+    ``(chats, next_cursor)``; next_cursor is None on the last page.
+    """
+    search = (search or "").strip()
+    
+    def load():
+        query = {}
+        if search:
+            query["chat_name"] = {"$regex": "^" + re.escape(search), "$options": "i"}
+        if platform:
+            query["platform"] = platform
+        if before:
+            query["$or"] = [
+                {"updated_at": {"$lt": before["updated_at"]}},
+                {"updated_at": before["updated_at"], "_id": {"$lt": before["_id"]}}
+            ]
+        
+        chats = list(chats_collection.find(
+            query,
+            CHAT_LIST_PROJECTION
+        ).sort([("updated_at", DESCENDING), ("_id", DESCENDING)]).limit(limit + 1))
+        
+        next_cursor = None
+        if len(chats) > limit:
+            chats = chats[:limit]
+            next_cursor = {"updated_at": chats[-1]["updated_at"], "_id": chats[-1]["_id"]}
+        return chats, next_cursor
+    
+    cursor_key = (before["updated_at"], before["_id"]) if before else None
+    chats, next_cursor = chat_cache.get_chat_list(
+        ("page", search.lower(), platform, cursor_key, limit), load
+    )
+    return [dict(chat) for chat in chats], next_cursor
 
 def get_chat_messages(chat_id):
     return list(messages_collection.find(
         {"chat_id": chat_id}
-    ).sort("timestamp", 1))
+    ).sort([("timestamp", ASCENDING), ("_id", ASCENDING)]))
+
+MESSAGE_LIST_PROJECTION = {"extracted_content": 0}
+
+def get_chat_messages_page(chat_id, before=None, limit=50):
+    """Return (messages, has_more) for the newest `limit` messages older than `before`.
+
+    `before` is the (timestamp, _id) of the oldest message already loaded;
+    messages come back oldest first and without their extracted_content.
+    """
+    query = {"chat_id": chat_id}
+    if before is not None:
+        timestamp, message_id = before
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": message_id}}
+        ]
+    
+    page = list(messages_collection.find(
+        query,
+        MESSAGE_LIST_PROJECTION
+    ).sort([("timestamp", DESCENDING), ("_id", DESCENDING)]).limit(limit + 1))
+    
+    has_more = len(page) > limit
+    return page[:limit][::-1], has_more
+
+def get_chat_messages_after(chat_id, after_id=None):
+    query = {"chat_id": chat_id}
+    if after_id is not None:
+        query["_id"] = {"$gt": after_id}
+    return list(messages_collection.find(
+        query,
+        {"role": 1, "content": 1}
+    ).sort("_id", 1))
 
 def delete_chat(chat_id):
 
+    for source in sources_collection.find({"chat_id": chat_id, "file_id": {"$exists": True}}, {"file_id": 1}):
+        source_files.delete(source["file_id"])
+    sources_collection.delete_many({"chat_id": chat_id})
     messages_collection.delete_many({"chat_id": chat_id})
+    jobs_collection.delete_many({"chat_id": chat_id})
     chats_collection.delete_one({"_id": chat_id})
 
+    indexing_queue.discard(chat_id)
+    chat_cache.invalidate(chat_id)
+
     vector_store.delete_chat_from_store(chat_id)
 
 def get_chat_info(chat_id):
-    return chats_collection.find_one({"_id": chat_id})
+    return chat_cache.get_chat(
+        chat_id, lambda chat_id: chats_collection.find_one({"_id": chat_id})
+    )
 
 
 
 
 class ChromaVectorStore:
     
-    def __init__(self, persist_directory="./chroma_db"):
+    def __init__(self, persist_directory="./chroma_db", embedding_cache_size=4096, embedding_model=None):
         
-        self.client = chromadb.PersistentClient(
-            path=persist_directory,
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
-        )
+        # The Chroma client and the embedding model are expensive to import and
+        # load, so they are created on first use (or by warm_up) rather than at
+        # import time.
+        self.persist_directory = persist_directory
+        self._client_lock = threading.Lock()
+        self._model_lock = threading.Lock()
+        self._client = None
+        self._collection = None
+        self._source_collection = None
+        self._embedding_model = embedding_model
         
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Status strings and repeated prompts are embedded over and over, so
+        # embeddings are memoized by content hash in a bounded LRU.
+        self.embedding_cache_size = embedding_cache_size
+        self._embedding_cache = OrderedDict()
+        self._embedding_lock = threading.Lock()
+        self._embedding_stats = {
+            "texts_requested": 0,
+            "cache_hits": 0,
+            "encode_calls": 0,
+            "texts_encoded": 0,
+            "max_batch_size": 0
+        }
+    
+    def _open_collections(self):
+        with self._client_lock:
+            if self._client is None:
+                import chromadb
+                from chromadb.config import Settings
+                
+                client = chromadb.PersistentClient(
+                    path=self.persist_directory,
+                    settings=Settings(
+                        anonymized_telemetry=False,
+                        allow_reset=True
+                    )
+                )
+                
+                self._collection = client.get_or_create_collection(
+                    name="chat_messages",
+                    metadata={"description": "Chat history for context retrieval"}
+                )
+                
+                self._source_collection = client.get_or_create_collection(
+                    name="source_chunks",
+                    metadata={"description": "Chunks of uploaded sources for passage retrieval"}
+                )
+                self._client = client
+    
+    @property
+    def client(self):
+        if self._client is None:
+            self._open_collections()
+        return self._client
+    
+    @property
+    def collection(self):
+        if self._client is None:
+            self._open_collections()
+        return self._collection
+    
+    @property
+    def source_collection(self):
+        if self._client is None:
+            self._open_collections()
+        return self._source_collection
+    
+    @property
+    def embedding_model(self):
+        if self._embedding_model is None:
+            with self._model_lock:
+                if self._embedding_model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        return self._embedding_model
+    
+    @embedding_model.setter
+    def embedding_model(self, model):
+        # Anything with a SentenceTransformer-style encode(texts, batch_size)
+        # works; cached embeddings from the previous model are dropped.
+        with self._model_lock:
+            self._embedding_model = model
+        with self._embedding_lock:
+            self._embedding_cache.clear()
+    
+    def warm_up(self) -> threading.Thread:
+        """Load the Chroma client and the embedding model in a background thread."""
+        def load():
+            try:
+                self.client
+                self.embedding_model
+            except Exception as e:
+                print(f"Error warming up vector store: {e}")
         
-        self.collection = self.client.get_or_create_collection(
-            name="chat_messages",
-            metadata={"description": "Chat history for context retrieval"}
-        )
+        thread = threading.Thread(target=load, name="vector-store-warmup", daemon=True)
+        thread.start()
+        return thread
     
     def _generate_embedding(self, text: str) -> List[float]:
-        return self.embedding_model.encode(text).tolist()
+        return self.encode_many([text])[0]
     
+    @timed_operation("encode_many")
+    def encode_many(
+        self,
+        texts: List[str],
+        batch_size: int = 64,
+        cache: bool = True
+    ) -> List[List[float]]:
+        
+        keys = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        embeddings = {}
+        missing = {}
+        
+        with self._embedding_lock:
+            self._embedding_stats["texts_requested"] += len(texts)
+            for key, text in zip(keys, texts):
+                if cache and key in self._embedding_cache:
+                    self._embedding_cache.move_to_end(key)
+                    embeddings[key] = self._embedding_cache[key]
+                    self._embedding_stats["cache_hits"] += 1
+                elif key in missing:
+                    self._embedding_stats["cache_hits"] += 1
+                else:
+                    missing[key] = text
+        
+        if missing:
+            vectors = self.embedding_model.encode(
+                list(missing.values()),
+                batch_size=batch_size
+            ).tolist()
+            
+            with self._embedding_lock:
+                self._embedding_stats["encode_calls"] += 1
+                self._embedding_stats["texts_encoded"] += len(missing)
+                self._embedding_stats["max_batch_size"] = max(
+                    self._embedding_stats["max_batch_size"], len(missing)
+                )
+                for key, vector in zip(missing, vectors):
+                    embeddings[key] = vector
+                    if cache:
+                        self._embedding_cache[key] = vector
+                        self._embedding_cache.move_to_end(key)
+                while len(self._embedding_cache) > self.embedding_cache_size:
+                    self._embedding_cache.popitem(last=False)
+        
+        return [embeddings[key] for key in keys]
+    
+    def embedding_stats(self) -> Dict[str, Any]:
+        
+        with self._embedding_lock:
+            stats = dict(self._embedding_stats)
+            stats["encodes_avoided"] = stats["cache_hits"]
+            stats["mean_batch_size"] = (
+                stats["texts_encoded"] / stats["encode_calls"]
+                if stats["encode_calls"] else 0.0
+            )
+            stats["cache_entries"] = len(self._embedding_cache)
+            return stats
+    
+    @timed_operation("add_message_to_store")
     def add_message_to_store(
         self, 
         chat_id: int, 
@@ -128,6 +651,35 @@ class ChromaVectorStore:
         except Exception as e:
             print(f"Error adding to vector store: {e}")
     
+    @timed_operation("add_messages_to_store")
+    def add_messages_to_store(self, chat_id: int, messages: List[Dict[str, Any]]) -> bool:
+        """Embed and upsert messages; False if nothing could be written."""
+        if not messages:
+            return True
+        
+        try:
+            embeddings = self.encode_many([msg["content"] for msg in messages])
+            timestamp = datetime.utcnow().isoformat()
+            
+            # upsert: the write-behind worker and a history sync may both
+            # index the same message.
+            self.collection.upsert(
+                embeddings=embeddings,
+                documents=[msg["content"] for msg in messages],
+                metadatas=[{
+                    "chat_id": str(chat_id),
+                    "role": msg["role"],
+                    "message_id": msg["message_id"],
+                    "timestamp": timestamp
+                } for msg in messages],
+                ids=[f"chat_{chat_id}_msg_{msg['message_id']}" for msg in messages]
+            )
+            return True
+        except Exception as e:
+            print(f"Error adding to vector store: {e}")
+            return False
+    
+    @timed_operation("get_relevant_context")
     def get_relevant_context(
         self, 
         chat_id: int, 
@@ -140,55 +692,181 @@ class ChromaVectorStore:
             results = self.collection.query(
                 query_embeddings=[query_embedding],
                 n_results=n_results,
-                where={"chat_id": str(chat_id)}
+                where={"chat_id": str(chat_id)},
+                include=["documents", "metadatas", "distances"]
             )
             
-            relevant_messages = []
+            candidates = []
+            indexed_ids = set()
             if results['documents'] and len(results['documents'][0]) > 0:
                 for i in range(len(results['documents'][0])):
-                    relevant_messages.append({
+                    indexed_ids.add(results['metadatas'][0][i]['message_id'])
+                    candidates.append((results['distances'][0][i], {
                         "content": results['documents'][0][i],
                         "role": results['metadatas'][0][i]['role'],
                         "timestamp": results['metadatas'][0][i]['timestamp']
-                    })
+                    }))
+            
+            # Read-your-writes: messages still queued for indexing are scored
+            # in-process with the same squared-L2 distance Chroma uses.
+            pending = [
+                msg for msg in indexing_queue.pending_messages(chat_id)
+                if msg["message_id"] not in indexed_ids
+            ]
+            if pending:
+                pending_embeddings = self.encode_many([msg["content"] for msg in pending])
+                for msg, embedding in zip(pending, pending_embeddings):
+                    distance = sum((a - b) ** 2 for a, b in zip(query_embedding, embedding))
+                    candidates.append((distance, {
+                        "content": msg["content"],
+                        "role": msg["role"],
+                        "timestamp": msg["timestamp"].isoformat()
+                    }))
+                candidates.sort(key=lambda candidate: candidate[0])
             
-            return relevant_messages
+            return [message for _, message in candidates[:n_results]]
             
         except Exception as e:
             print(f"Error querying vector store: {e}")
             return []
     
-    def load_chat_history_to_store(self, chat_id: int):
+    @timed_operation("load_chat_history_to_store")
+    def load_chat_history_to_store(
+        self,
+        chat_id: int,
+        messages: List[Dict[str, Any]] = None,
+        batch_size: int = 256
+    ):
         
         try:
-    
-            messages = get_chat_messages(chat_id)
+            if messages is None:
+                messages = get_chat_messages(chat_id)
             
-            for msg in messages:
-                message_id = str(msg['_id'])
-                
+            # One existence check for the whole batch instead of one per message.
+            candidate_ids = [f"chat_{chat_id}_msg_{msg['_id']}" for msg in messages]
+            existing_ids = set()
+            if candidate_ids:
+                existing_ids = set(self.collection.get(ids=candidate_ids, include=[])["ids"])
             
-                try:
-                    existing = self.collection.get(
-                        ids=[f"chat_{chat_id}_msg_{message_id}"]
-                    )
-                    if existing['ids']:
-                        continue 
-                except:
-                    pass
-                
-                self.add_message_to_store(
-                    chat_id=chat_id,
-                    message_id=message_id,
-                    role=msg['role'],
-                    content=msg['content']
-                )
+            missing = [
+                {
+                    "message_id": str(msg["_id"]),
+                    "role": msg["role"],
+                    "content": msg["content"]
+                }
+                for msg in messages
+                if f"chat_{chat_id}_msg_{msg['_id']}" not in existing_ids
+            ]
             
-            print(f"Loaded {len(messages)} messages to vector store for chat {chat_id}")
+            loaded = 0
+            for start in range(0, len(missing), batch_size):
+                batch = missing[start:start + batch_size]
+                if not self.add_messages_to_store(chat_id, batch):
+                    print(f"Loaded {loaded} of {len(missing)} missing messages to vector store for chat {chat_id} before a batch failed")
+                    return False
+                loaded += len(batch)
+            
+            print(f"Loaded {loaded} of {len(messages)} messages to vector store for chat {chat_id}")
+            return True
             
         except Exception as e:
             print(f"Error loading chat history: {e}")
+            return False
     
+    @timed_operation("sync_chat_to_store")
+    def sync_chat_to_store(self, chat_id: int, full: bool = False, batch_size: int = 256):
+        
+        # The chat document carries the _id of the newest message known to be
+        # indexed, so a sync only reads messages written after it. The
+        # watermark only moves past batches that were written, so a failed
+        # batch is retried by the next sync.
+        chat = chats_collection.find_one({"_id": chat_id}, {"vector_synced_id": 1})
+        watermark = None if full or not chat else chat.get("vector_synced_id")
+        
+        messages = get_chat_messages_after(chat_id, watermark)
+        for start in range(0, len(messages), batch_size):
+            batch = messages[start:start + batch_size]
+            if not self.load_chat_history_to_store(chat_id, batch, batch_size):
+                return
+            chats_collection.update_one(
+                {"_id": chat_id},
+                {"$max": {"vector_synced_id": batch[-1]["_id"]}}
+            )
+    
+    @timed_operation("index_source")
+    def index_source(
+        self,
+        chat_id: int,
+        source_id,
+        text: str,
+        batch_size: int = 256
+    ):
+        
+        try:
+            # Sources are immutable and batches are written in order, so the
+            # last chunk being present means the whole source was indexed. A
+            # source left partial by a failed batch is indexed again.
+            chunks = chunk_text(text, SOURCE_CHUNK_CHARS, overlap=SOURCE_CHUNK_OVERLAP)
+            if not chunks:
+                return
+            last_id = f"source_{source_id}_chunk_{len(chunks) - 1}"
+            if self.source_collection.get(ids=[last_id], include=[])["ids"]:
+                return
+            
+            for start in range(0, len(chunks), batch_size):
+                batch = chunks[start:start + batch_size]
+                # Source chunks are embedded once; keep them out of the LRU
+                # that serves repeated messages and queries.
+                self.source_collection.upsert(
+                    embeddings=self.encode_many(batch, cache=False),
+                    documents=batch,
+                    metadatas=[{
+                        "chat_id": str(chat_id),
+                        "source_id": str(source_id),
+                        "chunk": start + i
+                    } for i in range(len(batch))],
+                    ids=[f"source_{source_id}_chunk_{start + i}" for i in range(len(batch))]
+                )
+            
+            print(f"Indexed {len(chunks)} chunks of source {source_id} for chat {chat_id}")
+        
+        except Exception as e:
+            print(f"Error indexing source: {e}")
+    
+    @timed_operation("get_relevant_passages")
+    def get_relevant_passages(
+        self,
+        chat_id: int,
+        source_id,
+        query: str,
+        n_results: int = 4
+    ) -> List[str]:
+        
+        try:
+            results = self.source_collection.query(
+                query_embeddings=[self._generate_embedding(query)],
+                n_results=n_results,
+                where={"$and": [
+                    {"chat_id": str(chat_id)},
+                    {"source_id": str(source_id)}
+                ]}
+            )
+            
+            if not results['documents'] or not results['documents'][0]:
+                return []
+            
+            # Present passages in document order rather than by distance.
+            passages = sorted(
+                zip(results['metadatas'][0], results['documents'][0]),
+                key=lambda item: item[0]["chunk"]
+            )
+            return [document for _, document in passages]
+        
+        except Exception as e:
+            print(f"Error querying source passages: {e}")
+            return []
+    
+    @timed_operation("delete_chat_from_store")
     def delete_chat_from_store(self, chat_id: int):
         
         try:
@@ -199,13 +877,18 @@ class ChromaVectorStore:
             if results['ids']:
                 self.collection.delete(ids=results['ids'])
                 print(f"Deleted {len(results['ids'])} messages from vector store")
+            
+            self.source_collection.delete(where={"chat_id": str(chat_id)})
         
         except Exception as e:
             print(f"Error deleting from vector store: {e}")
     
     def get_full_chat_context(self, chat_id: int) -> str:
         
-        messages = get_chat_messages(chat_id)
+        messages = messages_collection.find(
+            {"chat_id": chat_id},
+            {"role": 1, "content": 1}
+        ).sort("timestamp", 1)
         
         context_lines = []
         for msg in messages:
@@ -216,10 +899,158 @@ class ChromaVectorStore:
         return "\n".join(context_lines)
 
 
-vector_store = ChromaVectorStore()
+vector_store = ChromaVectorStore(persist_directory=os.getenv("CHROMA_PERSIST_DIR", "./chroma_db"))
+
+
+class IndexingQueue:
+    """Write-behind worker for the side effects of save_message and save_source.
+
+    Saved messages are queued per chat; the worker drains a whole chat at a
+    time with one batched encode, one Chroma upsert and one updated_at touch.
+    Messages whose indexing fails are picked up again by sync_chat_to_store,
+    which only trusts the watermark. Sources are chunked and indexed one at a
+    time after any queued messages; one that fails is indexed at generation.
+    """
+    
+    COALESCE_DELAY = 0.05
+    
+    def __init__(self, store: ChromaVectorStore):
+        self._store = store
+        self._pending = OrderedDict()
+        self._in_flight = {}
+        # str(source_id) -> (chat_id, source_id), queued and being indexed
+        self._sources = OrderedDict()
+        self._indexing_sources = {}
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(
+            target=self._run, name="message-indexer", daemon=True
+        )
+        self._thread.start()
+    
+    def submit(self, chat_id: int, message: Dict[str, Any]):
+        self.submit_many(chat_id, [message])
+    
+    def submit_many(self, chat_id: int, messages: List[Dict[str, Any]]):
+        with self._cond:
+            self._pending.setdefault(chat_id, []).extend(messages)
+            self._cond.notify_all()
+    
+    def submit_source(self, chat_id: int, source_id):
+        with self._cond:
+            self._sources[str(source_id)] = (chat_id, source_id)
+            self._cond.notify_all()
+    
+    def take_source(self, source_id):
+        """Unqueue source_id, or wait while it is being indexed, so the caller can index it now."""
+        with self._cond:
+            self._sources.pop(str(source_id), None)
+            while str(source_id) in self._indexing_sources:
+                self._cond.wait()
+    
+    def depth(self) -> int:
+        with self._cond:
+            return (
+                sum(len(messages) for messages in self._pending.values())
+                + sum(len(messages) for messages in self._in_flight.values())
+            )
+    
+    def pending_messages(self, chat_id: int) -> List[Dict[str, Any]]:
+        with self._cond:
+            return self._in_flight.get(chat_id, []) + self._pending.get(chat_id, [])
+    
+    def discard(self, chat_id: int):
+        # Used when a chat is deleted: drop its queue and wait out any batch
+        # already being written so nothing lands in Chroma afterwards.
+        with self._cond:
+            self._pending.pop(chat_id, None)
+            for key in [key for key, (owner, _) in self._sources.items() if owner == chat_id]:
+                del self._sources[key]
+            while chat_id in self._in_flight or any(
+                owner == chat_id for owner, _ in self._indexing_sources.values()
+            ):
+                self._cond.wait()
+    
+    def flush(self, timeout: float = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_flight or self._sources or self._indexing_sources:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+    
+    def shutdown(self, timeout: float = 30):
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._sources and not self._stopping:
+                    self._cond.wait()
+                if self._stopping and not self._pending and not self._sources:
+                    return
+                if self._pending:
+                    # Give a burst of saves for the same chat a moment to coalesce.
+                    self._cond.wait(self.COALESCE_DELAY)
+                if self._pending:
+                    chat_id, messages = self._pending.popitem(last=False)
+                    self._in_flight[chat_id] = messages
+                    key = None
+                elif self._sources:
+                    key, (chat_id, source_id) = self._sources.popitem(last=False)
+                    self._indexing_sources[key] = (chat_id, source_id)
+                else:
+                    # discard() emptied the queue while we waited.
+                    continue
+            
+            try:
+                if key is None:
+                    self._write_messages(chat_id, messages)
+                else:
+                    self._store.index_source(chat_id, source_id, get_source_text(source_id) or "")
+            except Exception as e:
+                print(f"Error indexing {'saved messages' if key is None else 'source'}: {e}")
+            finally:
+                with self._cond:
+                    if key is None:
+                        del self._in_flight[chat_id]
+                    else:
+                        del self._indexing_sources[key]
+                    self._cond.notify_all()
+    
+    def _write_messages(self, chat_id: int, messages: List[Dict[str, Any]]):
+        self._store.add_messages_to_store(chat_id, messages)
+        chats_collection.update_one(
+            {"_id": chat_id},
+            {"$max": {"updated_at": max(msg["timestamp"] for msg in messages)}}
+        )
+        chat_cache.invalidate(chat_id)
+
+
+indexing_queue = IndexingQueue(vector_store)
+atexit.register(indexing_queue.shutdown)
+
+
+class ChatContext:
+    """Full transcript of a chat, only read from Mongo when first rendered."""
+    
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self._text = None
+    
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = vector_store.get_full_chat_context(self.chat_id)
+        return self._text
 
 
-def get_or_load_chat_context(chat_id: int) -> str:
+def get_or_load_chat_context(chat_id: int) -> ChatContext:
     
-    vector_store.load_chat_history_to_store(chat_id)
-    return vector_store.get_full_chat_context(chat_id)
\ No newline at end of file
+    vector_store.sync_chat_to_store(chat_id)
+    return ChatContext(chat_id)
\ No newline at end of file
@@ -1,100 +1,392 @@
-import PyPDF2
-from io import BytesIO
-from youtube_transcript_api import YouTubeTranscriptApi
-import re
+import os
+import hashlib
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, TypedDict, Annotated
 from datetime import datetime
 
-from langchain_ollama import ChatOllama
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.messages import HumanMessage, AIMessage
 
-from MongoData import vector_store, get_or_load_chat_context
+from MongoData import (vector_store, indexing_queue, get_or_load_chat_context, ChatContext,
+    summary_store)
+from LLMCache import LLMResponseCache, llm_cache
+from Extraction import chunk_text, extract_pdf_content, extract_youtube_transcript
+from Metrics import RunMetrics, finish_run, record_llm_call, run_stage
+from LLMClient import (
+    DEFAULT_MODEL, DEFAULT_TEMPERATURE, COMPLETION_TOKEN_RESERVE,
+    PRIORITY_INTERACTIVE, PRIORITY_GENERATION,
+    get_llm, sized_llm, clear_clients, scheduler as llm_scheduler,
+    routed_invoke, routed_ainvoke, routed_stream
+)
 
+# langgraph and langchain_core.runnables take over a second to import, so
+# they are imported where graphs are first built.
 
-def extract_pdf_content(pdf_file):
-    try:
-        pdf_reader = PyPDF2.PdfReader(BytesIO(pdf_file.read()))
-        
-        text_content = ""
-        for page in pdf_reader.pages:
-            text_content += page.extract_text() + "\n"
-        
-        return text_content.strip()
+
+# Process-wide registry shared by every Streamlit session. Compiled graphs
+# hold no per-request state, so they are built once per key and reused. LLM
+# clients live in LLMClient. RLock because building a workflow resolves its
+# LLM client.
+_registry_lock = threading.RLock()
+_compiled_workflows: Dict[tuple, Any] = {}
+
+
+def get_workflow(
+    platform: str,
+    model: str = DEFAULT_MODEL,
+    temperature: float = DEFAULT_TEMPERATURE
+):
+    builders = {
+        "Medium": create_medium_blog_workflow,
+        "LinkedIn": create_linkedin_post_workflow
+    }
+    if platform not in builders:
+        raise ValueError(f"No workflow registered for platform: {platform}")
+
+    key = (platform, model, temperature)
+    workflow = _compiled_workflows.get(key)
+    if workflow is None:
+        with _registry_lock:
+            workflow = _compiled_workflows.get(key)
+            if workflow is None:
+                workflow = builders[platform](model=model, temperature=temperature)
+                _compiled_workflows[key] = workflow
+    return workflow
+
+
+def clear_registry():
+    with _registry_lock:
+        clear_clients()
+        _compiled_workflows.clear()
+
+
+_background_loop = None
+
+
+def run_async(coro):
+    """Run a coroutine on the shared background event loop and wait for the result.
+
+    Async LLM connections are pooled per event loop, so blocking callers share
+    one long-lived loop rather than opening new connections under a fresh
+    asyncio.run() loop per call.
+    """
+    global _background_loop
+    if _background_loop is None:
+        with _registry_lock:
+            if _background_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="workflow-async-loop", daemon=True
+                ).start()
+                _background_loop = loop
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop).result()
+
+
+def _format_context(relevant_context, empty="No previous context available") -> str:
+    return "\n".join([
+        f"{msg['role'].upper()}: {msg['content']}" 
+        for msg in relevant_context
+    ]) if relevant_context else empty
+
+
+_SAMPLING_PARAMS = (
+    "num_ctx", "num_predict", "top_k", "top_p", "repeat_penalty",
+    "repeat_last_n", "seed", "mirostat", "mirostat_eta", "mirostat_tau",
+    "stop", "format"
+)
+
+
+def _llm_cache_key(llm, prompt: str) -> str:
+    params = {name: getattr(llm, name, None) for name in _SAMPLING_PARAMS}
+    return LLMResponseCache.make_key(llm.model, llm.temperature, params, prompt)
+
+
+def _invoke_llm(
+    llm,
+    prompt: str,
+    bypass_cache: bool = False,
+    session=None,
+    priority: int = PRIORITY_GENERATION,
+    on_queued=None,
+    cache=llm_cache,
+    completion_tokens: int = COMPLETION_TOKEN_RESERVE
+) -> str:
+    llm = sized_llm(llm, prompt, completion_tokens)
+    key = _llm_cache_key(llm, prompt)
+    if not bypass_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            record_llm_call(llm.model, prompt, cached=True)
+            return cached
+
+    response = routed_invoke(llm, [HumanMessage(content=prompt)], session, priority, on_queued)
+    record_llm_call(llm.model, prompt, response)
+    cache.put(key, response.content)
+    return response.content
+
+
+async def _ainvoke_llm(
+    llm,
+    prompt: str,
+    bypass_cache: bool = False,
+    session=None,
+    priority: int = PRIORITY_GENERATION,
+    on_queued=None,
+    cache=llm_cache,
+    completion_tokens: int = COMPLETION_TOKEN_RESERVE
+) -> str:
+    llm = sized_llm(llm, prompt, completion_tokens)
+    key = _llm_cache_key(llm, prompt)
+    if not bypass_cache:
+        # Cache tiers may read from disk or Mongo.
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            record_llm_call(llm.model, prompt, cached=True)
+            return cached
+
+    response = await routed_ainvoke(llm, [HumanMessage(content=prompt)], session, priority, on_queued)
+    record_llm_call(llm.model, prompt, response)
+    await asyncio.to_thread(cache.put, key, response.content)
+    return response.content
+
+
+def _bypass_cache(config) -> bool:
+    return bool((config or {}).get("configurable", {}).get("bypass_cache", False))
+
+
+def _queue_reporter(node: str):
+    """Callback passing the node's LLM queue position to the graph's custom stream."""
+    from langgraph.config import get_stream_writer
+
+    writer = get_stream_writer()
+    return lambda position: writer({"node": node, "position": position})
+
+
+def _llm_node(llm, build_prompt, output_key, status, completion_tokens=COMPLETION_TOKEN_RESERVE):
+    """Turn a prompt builder into a graph node with sync and async paths.
+
+    The node stores the LLM reply under ``output_key`` and appends
+    ``status(reply)`` to the workflow messages. ``invoke``/``stream`` on the
+    compiled graph run the sync path, ``ainvoke``/``astream`` the async one.
+    ``completion_tokens`` is the expected reply length, used with the prompt
+    to size the context window. Replies go through the LLM response cache
+    unless the run's config sets ``bypass_cache``, and the node is timed as a stage of the run's metrics.
+    Requests are routed with the chat as the session, so every node of a
+    run lands on the same Ollama backend, and queue at generation priority;
+    while a node waits, its queue position goes to the custom stream.
+    """
+    from langchain_core.runnables import RunnableLambda
     
-    except Exception as e:
-        return f"Error extracting PDF content: {str(e)}"
+    def apply_response(state, content):
+        state[output_key] = content
+        state["messages"].append(AIMessage(content=status(content)))
+        return state
 
+    name = build_prompt.__name__
 
-def extract_youtube_transcript(url):
-    try:
-        video_id = None
-        patterns = [
-            r'(?:youtube\.com\/watch\?v=|youtu\.be\/)([^&\n?#]+)',
-            r'youtube\.com\/embed\/([^&\n?#]+)',
-            r'youtube\.com\/v\/([^&\n?#]+)'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                video_id = match.group(1)
-                break
-        
-        if not video_id:
-            return "Error: Invalid YouTube URL"
+    def node(state, config):
+        with run_stage(config, name):
+            prompt = build_prompt(state)
+            reply = _invoke_llm(
+                llm, prompt, _bypass_cache(config), state["chat_id"],
+                on_queued=_queue_reporter(name), completion_tokens=completion_tokens
+            )
+        return apply_response(state, reply)
 
-        transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
+    async def anode(state, config):
+        with run_stage(config, name):
+            # Prompt builders may hit the vector store, which is blocking.
+            prompt = await asyncio.to_thread(build_prompt, state)
+            reply = await _ainvoke_llm(
+                llm, prompt, _bypass_cache(config), state["chat_id"],
+                on_queued=_queue_reporter(name), completion_tokens=completion_tokens
+            )
+        return apply_response(state, reply)
 
-        transcript_text = " ".join([segment['text'] for segment in transcript_list])
-        
-        return transcript_text
+    return RunnableLambda(node, afunc=anode, name=name)
+
+
+# Long sources are condensed by map-reduce summarization before the
+# outline/insight nodes see them, instead of being cut to the first few
+# thousand characters.
+DIGEST_CHARS = 4000
+SUMMARY_CHUNK_CHARS = 6000
+SUMMARY_TEMPERATURE = 0.2
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+
+
+def _summary_prompt(text: str) -> str:
+    # Deliberately independent of the user's request: the prompt, and so the
+    # cache key, depends only on the chunk, and every later request on the
+    # same source reuses its summaries.
+    return f"""Summarize the following section of a longer document.
+
+Keep every concrete fact, figure, name, example and argument that a writer
+would need to create content from it. Do not add commentary. Use at most
+150 words.
+
+Section:
+{text}"""
+
+
+def _digest_levels(summaries: List[str], previous_length: int):
+    combined = "\n\n".join(summaries)
+    if len(combined) <= DIGEST_CHARS or len(combined) >= previous_length:
+        return combined[:DIGEST_CHARS], None
+    return None, chunk_text(combined, SUMMARY_CHUNK_CHARS)
+
+
+def build_source_digest(llm, raw_content: str, on_queued=None):
+    """Return (digest, chunk_count) for raw_content, at most DIGEST_CHARS long."""
+    if len(raw_content) <= DIGEST_CHARS:
+        return raw_content, 0
     
-    except Exception as e:
-        return f"Error extracting YouTube transcript: {str(e)}"
+    chunks = chunk_text(raw_content, SUMMARY_CHUNK_CHARS)
+    chunk_count = len(chunks)
+    previous_length = len(raw_content)
+    with ThreadPoolExecutor(max_workers=SUMMARY_CONCURRENCY) as pool:
+        while True:
+            # Each task runs in a copy of this context so its LLM call is
+            # recorded against the caller's metrics stage. Summaries carry no
+            # session, so the router spreads them over the backends.
+            summaries = [future.result() for future in [
+                pool.submit(
+                    contextvars.copy_context().run,
+                    _invoke_llm, llm, _summary_prompt(chunk),
+                    on_queued=on_queued, cache=summary_store
+                )
+                for chunk in chunks
+            ]]
+            digest, chunks = _digest_levels(summaries, previous_length)
+            if digest is not None:
+                return digest, chunk_count
+            previous_length = sum(len(chunk) for chunk in chunks)
+
+
+async def abuild_source_digest(llm, raw_content: str, on_queued=None):
+    if len(raw_content) <= DIGEST_CHARS:
+        return raw_content, 0
+    
+    semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+    
+    async def summarize(chunk):
+        async with semaphore:
+            return await _ainvoke_llm(
+                llm, _summary_prompt(chunk), on_queued=on_queued, cache=summary_store
+            )
+    
+    chunks = chunk_text(raw_content, SUMMARY_CHUNK_CHARS)
+    chunk_count = len(chunks)
+    previous_length = len(raw_content)
+    while True:
+        summaries = await asyncio.gather(*(summarize(chunk) for chunk in chunks))
+        digest, chunks = _digest_levels(summaries, previous_length)
+        if digest is not None:
+            return digest, chunk_count
+        previous_length = sum(len(chunk) for chunk in chunks)
+
+
+def _digest_node(model: str):
+    from langchain_core.runnables import RunnableLambda
+    
+    llm = get_llm(model, SUMMARY_TEMPERATURE)
+    
+    def apply_digest(state, digest, chunk_count):
+        state["source_digest"] = digest
+        if chunk_count:
+            state["messages"].append(AIMessage(
+                content=f"📚 **Source Condensed** from {chunk_count} sections"
+            ))
+        return state
+    
+    def digest_source(state, config):
+        with run_stage(config, "digest_source"):
+            digest = build_source_digest(llm, state["raw_content"], _queue_reporter("digest_source"))
+        return apply_digest(state, *digest)
+    
+    async def adigest_source(state, config):
+        with run_stage(config, "digest_source"):
+            digest = await abuild_source_digest(llm, state["raw_content"], _queue_reporter("digest_source"))
+        return apply_digest(state, *digest)
+    
+    return RunnableLambda(digest_source, afunc=adigest_source, name="digest_source")
+
+
+SOURCE_PASSAGES = 4
+
+
+def _resolve_source(chat_id, raw_content, source_id):
+    # Sources saved through the UI are indexed in the background after upload;
+    # anything else (legacy chats, API callers) is indexed here under a
+    # content-derived id. Indexing is idempotent, so this is a single lookup
+    # once the source is in Chroma.
+    # Chunks are stored and retrieved per chat, so the id includes the chat.
+    if source_id is None:
+        digest = hashlib.sha256(raw_content.encode("utf-8")).hexdigest()[:24]
+        source_id = f"content_{chat_id}_{digest}"
+    else:
+        # An upload still waiting on the indexing worker is indexed here instead.
+        indexing_queue.take_source(source_id)
+    vector_store.index_source(chat_id, source_id, raw_content)
+    return str(source_id)
+
+
+def _source_passages(state) -> str:
+    passages = vector_store.get_relevant_passages(
+        chat_id=state["chat_id"],
+        source_id=state["source_id"],
+        query=state["user_request"],
+        n_results=SOURCE_PASSAGES
+    )
+    return "\n\n---\n\n".join(passages) if passages else "No matching passages"
+
 
 class BlogState(TypedDict):
     messages: Annotated[List, "The conversation messages"]
     raw_content: str
+    source_id: str
+    source_digest: str
     platform: str
     user_request: str
     outline: str
     draft_blog: str
     final_blog: str
     chat_id: int
-    chat_context: str
+    chat_context: ChatContext
 
-def create_medium_blog_workflow():
+# The draft and the refined post are 1200-1800 words of markdown, about 2,400
+# tokens at the long end, so those nodes reserve more than the default.
+BLOG_POST_COMPLETION_TOKENS = 3072
+
+def create_medium_blog_workflow(
+    model: str = DEFAULT_MODEL,
+    temperature: float = DEFAULT_TEMPERATURE
+):
     
-    llm = ChatOllama(
-        model="llama3.2", 
-        temperature=0.7,
-        base_url="http://localhost:11434"  
-    )
-    def analyze_and_outline(state: BlogState) -> BlogState:
+    llm = get_llm(model, temperature)
+    def analyze_and_outline(state: BlogState) -> str:
         relevant_context = vector_store.get_relevant_context(
             chat_id=state["chat_id"],
             query=state["user_request"],
             n_results=3
         )
-
-
-        context_str = "\n".join([
-            f"{msg['role'].upper()}: {msg['content']}" 
-            for msg in relevant_context
-        ]) if relevant_context else "No previous context available"
+        context_str = _format_context(relevant_context)
         
-        prompt = f"""You are an expert content strategist and Medium blog writer.
+        return f"""You are an expert content strategist and Medium blog writer.
 
 Previous conversation context:
 {context_str}
 
 User's request: {state['user_request']}
 
-Raw content to analyze:
-{state['raw_content'][:3000]}...
+Source content to analyze:
+{state['source_digest']}
+
+Passages from the source most relevant to the request:
+{_source_passages(state)}
 
 Create a detailed outline for a Medium blog post that:
 1. Has an engaging, SEO-friendly title
@@ -104,22 +396,19 @@ Create a detailed outline for a Medium blog post that:
 5. Makes the content engaging and valuable
 
 Provide the outline in a clear, structured format with markdown headers."""
-        
-        response = llm.invoke([HumanMessage(content=prompt)])
-        state["outline"] = response.content
-        state["messages"].append(AIMessage(content=f"📋 **Outline Created**\n\n{response.content[:200]}..."))
-        
-        return state
     
-    def generate_draft(state: BlogState) -> BlogState:
+    def generate_draft(state: BlogState) -> str:
         
-        prompt = f"""You are an expert Medium blog writer with years of experience.
+        return f"""You are an expert Medium blog writer with years of experience.
 
 Based on this outline:
 {state['outline']}
 
-And this raw content:
-{state['raw_content'][:4000]}...
+And this source content:
+{state['source_digest']}
+
+Passages from the source most relevant to the request:
+{_source_passages(state)}
 
 Write a complete Medium blog post that:
 1. Has an attention-grabbing introduction with a hook
@@ -139,16 +428,10 @@ Write a complete Medium blog post that:
 8. Written in a conversational yet professional tone
 
 Write the complete blog post in Markdown format."""
-        
-        response = llm.invoke([HumanMessage(content=prompt)])
-        state["draft_blog"] = response.content
-        state["messages"].append(AIMessage(content="✍️ **Draft Blog Generated**"))
-        
-        return state
     
-    def refine_blog(state: BlogState) -> BlogState:
+    def refine_blog(state: BlogState) -> str:
         
-        prompt = f"""You are an expert editor specializing in Medium blog posts.
+        return f"""You are an expert editor specializing in Medium blog posts.
 
 Review and refine this draft blog post:
 
@@ -168,97 +451,203 @@ Improve it by:
 
 Provide the final, polished, publication-ready version in Markdown format.
 Make it shine! ✨"""
-        
-        response = llm.invoke([HumanMessage(content=prompt)])
-        state["final_blog"] = response.content
-        state["messages"].append(AIMessage(content="✨ **Final Blog Post Ready!**"))
-        
-        return state
+    
+    from langgraph.graph import StateGraph, END
     
     workflow = StateGraph(BlogState)
     
-    workflow.add_node("analyze_outline", analyze_and_outline)
-    workflow.add_node("generate_draft", generate_draft)
-    workflow.add_node("refine_polish", refine_blog)
+    workflow.add_node("analyze_outline", _llm_node(
+        llm, analyze_and_outline, "outline",
+        lambda reply: f"📋 **Outline Created**\n\n{reply[:200]}..."
+    ))
+    workflow.add_node("generate_draft", _llm_node(
+        llm, generate_draft, "draft_blog",
+        lambda reply: "✍️ **Draft Blog Generated**",
+        completion_tokens=BLOG_POST_COMPLETION_TOKENS
+    ))
+    workflow.add_node("refine_polish", _llm_node(
+        llm, refine_blog, "final_blog",
+        lambda reply: "✨ **Final Blog Post Ready!**",
+        completion_tokens=BLOG_POST_COMPLETION_TOKENS
+    ))
     
-    workflow.set_entry_point("analyze_outline")
+    workflow.add_node("digest_source", _digest_node(model))
+    
+    workflow.set_entry_point("digest_source")
+    workflow.add_edge("digest_source", "analyze_outline")
     workflow.add_edge("analyze_outline", "generate_draft")
     workflow.add_edge("generate_draft", "refine_polish")
     workflow.add_edge("refine_polish", END)
     
-    memory = MemorySaver()
-    app = workflow.compile(checkpointer=memory)
+    app = workflow.compile()
     
     return app
 
 
+def _medium_blog_state(chat_id, raw_content, user_request, platform, source_id=None):
+    return {
+        "messages": [],
+        "raw_content": raw_content,
+        "source_id": _resolve_source(chat_id, raw_content, source_id),
+        "source_digest": "",
+        "platform": platform,
+        "user_request": user_request,
+        "outline": "",
+        "draft_blog": "",
+        "final_blog": "",
+        "chat_id": chat_id,
+        "chat_context": get_or_load_chat_context(chat_id)
+    }
+
+
+def _medium_blog_result(final_state) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "outline": final_state["outline"],
+        "draft": final_state["draft_blog"],
+        "final_blog": final_state["final_blog"],
+        "workflow_messages": final_state["messages"]
+    }
+
+
+def _stream_workflow(workflow, initial_state, config):
+    """Yield token, queued and stage events from a compiled workflow; returns the final state."""
+    final_state = dict(initial_state)
+    message_count = 0
+    for mode, payload in workflow.stream(
+        initial_state, config, stream_mode=["messages", "updates", "custom"]
+    ):
+        if mode == "custom":
+            yield {"type": "queued", "node": payload["node"], "position": payload["position"]}
+        elif mode == "messages":
+            chunk, metadata = payload
+            if chunk.content:
+                yield {
+                    "type": "token",
+                    "node": metadata.get("langgraph_node"),
+                    "content": chunk.content
+                }
+        else:
+            for node, update in payload.items():
+                final_state.update(update)
+                messages = final_state["messages"]
+                yield {
+                    "type": "stage",
+                    "node": node,
+                    "message": messages[-1].content if len(messages) > message_count else None
+                }
+                message_count = len(messages)
+    return final_state
+
+
 def generate_medium_blog(
     chat_id: int,
     raw_content: str,
     user_request: str,
-    platform: str = "Medium"
+    platform: str = "Medium",
+    bypass_cache: bool = False,
+    source_id: str = None
 ) -> Dict[str, Any]:
     
+    metrics = RunMetrics("medium_blog")
     try:
-        chat_context = get_or_load_chat_context(chat_id)
-        workflow = create_medium_blog_workflow()
-
-        initial_state = {
-            "messages": [],
-            "raw_content": raw_content,
-            "platform": platform,
-            "user_request": user_request,
-            "outline": "",
-            "draft_blog": "",
-            "final_blog": "",
-            "chat_id": chat_id,
-            "chat_context": chat_context
-        }
+        workflow = get_workflow("Medium")
+        with metrics.stage("prepare"):
+            initial_state = _medium_blog_state(chat_id, raw_content, user_request, platform, source_id)
         
-        config = {"configurable": {"thread_id": f"chat_{chat_id}"}}
+        config = {"configurable": {"thread_id": f"chat_{chat_id}", "bypass_cache": bypass_cache, "metrics": metrics}}
         final_state = workflow.invoke(initial_state, config)
         
-        return {
-            "success": True,
-            "outline": final_state["outline"],
-            "draft": final_state["draft_blog"],
-            "final_blog": final_state["final_blog"],
-            "workflow_messages": final_state["messages"]
-        }
+        result = _medium_blog_result(final_state)
         
     except Exception as e:
-        return {
+        result = {
             "success": False,
             "error": f"Error generating blog: {str(e)}"
         }
+    
+    result["metrics"] = finish_run(metrics)
+    return result
 
 
-def process_user_message_with_context(
+async def agenerate_medium_blog(
     chat_id: int,
-    user_message: str,
-    extracted_content: str = None
-) -> str:
+    raw_content: str,
+    user_request: str,
+    platform: str = "Medium",
+    bypass_cache: bool = False,
+    source_id: str = None
+) -> Dict[str, Any]:
     
+    metrics = RunMetrics("medium_blog")
     try:
+        workflow = get_workflow("Medium")
+        with metrics.stage("prepare"):
+            initial_state = await asyncio.to_thread(
+                _medium_blog_state, chat_id, raw_content, user_request, platform, source_id
+            )
         
-        relevant_context = vector_store.get_relevant_context(
-            chat_id=chat_id,
-            query=user_message,
-            n_results=5
-        )
+        config = {"configurable": {"thread_id": f"chat_{chat_id}", "bypass_cache": bypass_cache, "metrics": metrics}}
+        final_state = await workflow.ainvoke(initial_state, config)
         
-        context_str = "\n".join([
-            f"{msg['role'].upper()}: {msg['content']}" 
-            for msg in relevant_context
-        ]) if relevant_context else "No previous context"
-    
-        llm = ChatOllama(
-            model="llama3.2",
-            temperature=0.7,
-            base_url="http://localhost:11434"
-        )
+        result = _medium_blog_result(final_state)
         
-        prompt = f"""You are a helpful AI assistant specializing in content creation for social media.
+    except Exception as e:
+        result = {
+            "success": False,
+            "error": f"Error generating blog: {str(e)}"
+        }
+    
+    result["metrics"] = finish_run(metrics)
+    return result
+
+
+def stream_medium_blog(
+    chat_id: int,
+    raw_content: str,
+    user_request: str,
+    platform: str = "Medium",
+    bypass_cache: bool = False,
+    source_id: str = None
+):
+    """Streaming variant of generate_medium_blog.
+
+    Yields {"type": "token"} chunks and {"type": "stage"} events as each node
+    finishes, {"type": "queued"} events with the position while a node waits
+    for an LLM slot, then a single {"type": "result"} event with the same
+    payload generate_medium_blog returns.
+    """
+    metrics = RunMetrics("medium_blog")
+    try:
+        workflow = get_workflow("Medium")
+        with metrics.stage("prepare"):
+            initial_state = _medium_blog_state(chat_id, raw_content, user_request, platform, source_id)
+
+        config = {"configurable": {"thread_id": f"chat_{chat_id}", "bypass_cache": bypass_cache, "metrics": metrics}}
+        final_state = yield from _stream_workflow(workflow, initial_state, config)
+
+        result = _medium_blog_result(final_state)
+
+    except Exception as e:
+        result = {
+            "success": False,
+            "error": f"Error generating blog: {str(e)}"
+        }
+
+    result["metrics"] = finish_run(metrics)
+    yield {"type": "result", "result": result}
+
+
+def _user_message_prompt(chat_id, user_message, extracted_content):
+    relevant_context = vector_store.get_relevant_context(
+        chat_id=chat_id,
+        query=user_message,
+        n_results=5
+    )
+    
+    context_str = _format_context(relevant_context, empty="No previous context")
+    
+    return f"""You are a helpful AI assistant specializing in content creation for social media.
 
 Previous conversation context:
 {context_str}
@@ -268,36 +657,130 @@ Previous conversation context:
 User's message: {user_message}
 
 Provide a helpful, contextual response. If the user is asking to generate content, guide them on what information you need."""
+
+
+def process_user_message_with_context(
+    chat_id: int,
+    user_message: str,
+    extracted_content: str = None,
+    bypass_cache: bool = False
+) -> str:
+    
+    metrics = RunMetrics("chat_reply")
+    try:
+        with metrics.stage("retrieve_context"):
+            prompt = _user_message_prompt(chat_id, user_message, extracted_content)
         
-        response = llm.invoke([HumanMessage(content=prompt)])
-        return response.content
+        with metrics.stage("reply"):
+            reply = _invoke_llm(get_llm(), prompt, bypass_cache, chat_id, PRIORITY_INTERACTIVE)
         
     except Exception as e:
-        return f"Error processing message: {str(e)}"
+        reply = f"Error processing message: {str(e)}"
+    
+    finish_run(metrics)
+    return reply
+
+
+async def aprocess_user_message_with_context(
+    chat_id: int,
+    user_message: str,
+    extracted_content: str = None,
+    bypass_cache: bool = False
+) -> str:
+    
+    metrics = RunMetrics("chat_reply")
+    try:
+        with metrics.stage("retrieve_context"):
+            prompt = await asyncio.to_thread(
+                _user_message_prompt, chat_id, user_message, extracted_content
+            )
+        
+        with metrics.stage("reply"):
+            reply = await _ainvoke_llm(get_llm(), prompt, bypass_cache, chat_id, PRIORITY_INTERACTIVE)
+        
+    except Exception as e:
+        reply = f"Error processing message: {str(e)}"
+    
+    finish_run(metrics)
+    return reply
+
+
+def stream_user_message_with_context(
+    chat_id: int,
+    user_message: str,
+    extracted_content: str = None,
+    bypass_cache: bool = False
+):
+    """Streaming variant of process_user_message_with_context.
+
+    Yields {"type": "queued"} events while the reply waits for an LLM slot,
+    {"type": "token"} chunks, then a {"type": "result"} event holding the
+    complete reply.
+    """
+    metrics = RunMetrics("chat_reply")
+    try:
+        with metrics.stage("retrieve_context"):
+            prompt = _user_message_prompt(chat_id, user_message, extracted_content)
+
+        llm = sized_llm(get_llm(), prompt)
+        key = _llm_cache_key(llm, prompt)
+        reply = None if bypass_cache else llm_cache.get(key)
+        start = time.perf_counter()
+
+        if reply is None:
+            # The stage can't stay active across yields, so the merged
+            # response and the queue times are recorded once the stream is done.
+            ticket = llm_scheduler.enter(PRIORITY_INTERACTIVE)
+            try:
+                for position in ticket.queued_positions():
+                    yield {"type": "queued", "node": "reply", "position": position}
+                response = None
+                for chunk in routed_stream(llm, [HumanMessage(content=prompt)], chat_id, ticket=ticket):
+                    response = chunk if response is None else response + chunk
+                    if chunk.content:
+                        yield {"type": "token", "node": "reply", "content": chunk.content}
+            finally:
+                with metrics.stage("reply"):
+                    ticket.release()
+            reply = response.content if response is not None else ""
+            llm_cache.put(key, reply)
+            with metrics.stage("reply"):
+                record_llm_call(llm.model, prompt, response)
+        else:
+            with metrics.stage("reply"):
+                record_llm_call(llm.model, prompt, cached=True)
+        metrics.add_wall_time("reply", time.perf_counter() - start)
+
+    except Exception as e:
+        reply = f"Error processing message: {str(e)}"
+
+    finish_run(metrics)
+    yield {"type": "result", "result": reply}
 
 
 class LinkedInState(TypedDict):
     """State for LinkedIn post generation workflow."""
     messages: Annotated[List, "The conversation messages"]
     raw_content: str
+    source_id: str
+    source_digest: str
     platform: str
     user_request: str
     key_insights: str
     post_draft: str
     final_post: str
     chat_id: int
-    chat_context: str
+    chat_context: ChatContext
 
 
-def create_linkedin_post_workflow():
+def create_linkedin_post_workflow(
+    model: str = DEFAULT_MODEL,
+    temperature: float = DEFAULT_TEMPERATURE
+):
     
-    llm = ChatOllama(
-        model="llama3.2",
-        temperature=0.7,
-        base_url="http://localhost:11434"
-    )
+    llm = get_llm(model, temperature)
     
-    def extract_insights(state: LinkedInState) -> LinkedInState:
+    def extract_insights(state: LinkedInState) -> str:
         """Extract key professional insights from raw content."""
         
         relevant_context = vector_store.get_relevant_context(
@@ -305,21 +788,20 @@ def create_linkedin_post_workflow():
             query=state["user_request"],
             n_results=3
         )
+        context_str = _format_context(relevant_context)
         
-        context_str = "\n".join([
-            f"{msg['role'].upper()}: {msg['content']}" 
-            for msg in relevant_context
-        ]) if relevant_context else "No previous context available"
-        
-        prompt = f"""You are a LinkedIn content strategist expert.
+        return f"""You are a LinkedIn content strategist expert.
 
 Previous conversation context:
 {context_str}
 
 User's request: {state['user_request']}
 
-Raw content to analyze:
-{state['raw_content'][:3000]}...
+Source content to analyze:
+{state['source_digest']}
+
+Passages from the source most relevant to the request:
+{_source_passages(state)}
 
 Extract 3-5 key professional insights from this content that would resonate with a LinkedIn audience.
 Focus on:
@@ -330,23 +812,20 @@ Focus on:
 - Business insights
 
 List the insights clearly and concisely."""
-        
-        response = llm.invoke([HumanMessage(content=prompt)])
-        state["key_insights"] = response.content
-        state["messages"].append(AIMessage(content=f"💡 **Key Insights Extracted**\n\n{response.content[:150]}..."))
-        
-        return state
     
-    def create_post_draft(state: LinkedInState) -> LinkedInState:
+    def create_post_draft(state: LinkedInState) -> str:
         """Create engaging LinkedIn post draft."""
         
-        prompt = f"""You are an expert LinkedIn content creator known for viral posts.
+        return f"""You are an expert LinkedIn content creator known for viral posts.
 
 Key insights to work with:
 {state['key_insights']}
 
 Original content:
-{state['raw_content'][:2000]}...
+{state['source_digest']}
+
+Passages from the source most relevant to the request:
+{_source_passages(state)}
 
 User's request: {state['user_request']}
 
@@ -361,17 +840,11 @@ Create a compelling LinkedIn post that:
 8. NO hashtags yet (will be added in refinement)
 
 Write the post in plain text format."""
-        
-        response = llm.invoke([HumanMessage(content=prompt)])
-        state["post_draft"] = response.content
-        state["messages"].append(AIMessage(content="✍️ **LinkedIn Post Draft Created**"))
-        
-        return state
     
-    def refine_linkedin_post(state: LinkedInState) -> LinkedInState:
+    def refine_linkedin_post(state: LinkedInState) -> str:
         """Refine post and add hashtags, formatting."""
         
-        prompt = f"""You are a LinkedIn engagement specialist.
+        return f"""You are a LinkedIn engagement specialist.
 
 Review this LinkedIn post draft:
 
@@ -390,67 +863,186 @@ Refine it by:
 
 Provide the final, polished LinkedIn post ready to publish.
 Format with proper spacing and line breaks."""
-        
-        response = llm.invoke([HumanMessage(content=prompt)])
-        state["final_post"] = response.content
-        state["messages"].append(AIMessage(content="✨ **LinkedIn Post Ready!**"))
-        
-        return state
+    
+    from langgraph.graph import StateGraph, END
     
     workflow = StateGraph(LinkedInState)
     
-    workflow.add_node("extract_insights", extract_insights)
-    workflow.add_node("create_draft", create_post_draft)
-    workflow.add_node("refine_post", refine_linkedin_post)
+    workflow.add_node("extract_insights", _llm_node(
+        llm, extract_insights, "key_insights",
+        lambda reply: f"💡 **Key Insights Extracted**\n\n{reply[:150]}..."
+    ))
+    workflow.add_node("create_draft", _llm_node(
+        llm, create_post_draft, "post_draft",
+        lambda reply: "✍️ **LinkedIn Post Draft Created**"
+    ))
+    workflow.add_node("refine_post", _llm_node(
+        llm, refine_linkedin_post, "final_post",
+        lambda reply: "✨ **LinkedIn Post Ready!**"
+    ))
+    
+    workflow.add_node("digest_source", _digest_node(model))
     
-    workflow.set_entry_point("extract_insights")
+    workflow.set_entry_point("digest_source")
+    workflow.add_edge("digest_source", "extract_insights")
     workflow.add_edge("extract_insights", "create_draft")
     workflow.add_edge("create_draft", "refine_post")
     workflow.add_edge("refine_post", END)
     
-    memory = MemorySaver()
-    app = workflow.compile(checkpointer=memory)
+    app = workflow.compile()
     
     return app
 
 
+def _linkedin_post_state(chat_id, raw_content, user_request, platform, source_id=None):
+    return {
+        "messages": [],
+        "raw_content": raw_content,
+        "source_id": _resolve_source(chat_id, raw_content, source_id),
+        "source_digest": "",
+        "platform": platform,
+        "user_request": user_request,
+        "key_insights": "",
+        "post_draft": "",
+        "final_post": "",
+        "chat_id": chat_id,
+        "chat_context": get_or_load_chat_context(chat_id)
+    }
+
+
+def _linkedin_post_result(final_state) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "insights": final_state["key_insights"],
+        "draft": final_state["post_draft"],
+        "final_post": final_state["final_post"],
+        "workflow_messages": final_state["messages"]
+    }
+
+
 def generate_linkedin_post(
     chat_id: int,
     raw_content: str,
     user_request: str,
-    platform: str = "LinkedIn"
+    platform: str = "LinkedIn",
+    bypass_cache: bool = False,
+    source_id: str = None
 ) -> Dict[str, Any]:
     
+    metrics = RunMetrics("linkedin_post")
     try:
-        chat_context = get_or_load_chat_context(chat_id)
+        workflow = get_workflow("LinkedIn")
+        with metrics.stage("prepare"):
+            initial_state = _linkedin_post_state(chat_id, raw_content, user_request, platform, source_id)
+        
+        config = {"configurable": {"thread_id": f"chat_{chat_id}_linkedin", "bypass_cache": bypass_cache, "metrics": metrics}}
+        final_state = workflow.invoke(initial_state, config)
         
-        workflow = create_linkedin_post_workflow()
+        result = _linkedin_post_result(final_state)
         
-        initial_state = {
-            "messages": [],
-            "raw_content": raw_content,
-            "platform": platform,
-            "user_request": user_request,
-            "key_insights": "",
-            "post_draft": "",
-            "final_post": "",
-            "chat_id": chat_id,
-            "chat_context": chat_context
+    except Exception as e:
+        result = {
+            "success": False,
+            "error": f"Error generating LinkedIn post: {str(e)}"
         }
+    
+    result["metrics"] = finish_run(metrics)
+    return result
+
+
+async def agenerate_linkedin_post(
+    chat_id: int,
+    raw_content: str,
+    user_request: str,
+    platform: str = "LinkedIn",
+    bypass_cache: bool = False,
+    source_id: str = None
+) -> Dict[str, Any]:
+    
+    metrics = RunMetrics("linkedin_post")
+    try:
+        workflow = get_workflow("LinkedIn")
+        with metrics.stage("prepare"):
+            initial_state = await asyncio.to_thread(
+                _linkedin_post_state, chat_id, raw_content, user_request, platform, source_id
+            )
         
-        config = {"configurable": {"thread_id": f"chat_{chat_id}_linkedin"}}
-        final_state = workflow.invoke(initial_state, config)
+        config = {"configurable": {"thread_id": f"chat_{chat_id}_linkedin", "bypass_cache": bypass_cache, "metrics": metrics}}
+        final_state = await workflow.ainvoke(initial_state, config)
         
-        return {
-            "success": True,
-            "insights": final_state["key_insights"],
-            "draft": final_state["post_draft"],
-            "final_post": final_state["final_post"],
-            "workflow_messages": final_state["messages"]
-        }
+        result = _linkedin_post_result(final_state)
         
     except Exception as e:
-        return {
+        result = {
+            "success": False,
+            "error": f"Error generating LinkedIn post: {str(e)}"
+        }
+    
+    result["metrics"] = finish_run(metrics)
+    return result
+
+
+def stream_linkedin_post(
+    chat_id: int,
+    raw_content: str,
+    user_request: str,
+    platform: str = "LinkedIn",
+    bypass_cache: bool = False,
+    source_id: str = None
+):
+    """Streaming variant of generate_linkedin_post; see stream_medium_blog."""
+    metrics = RunMetrics("linkedin_post")
+    try:
+        workflow = get_workflow("LinkedIn")
+        with metrics.stage("prepare"):
+            initial_state = _linkedin_post_state(chat_id, raw_content, user_request, platform, source_id)
+
+        config = {"configurable": {"thread_id": f"chat_{chat_id}_linkedin", "bypass_cache": bypass_cache, "metrics": metrics}}
+        final_state = yield from _stream_workflow(workflow, initial_state, config)
+
+        result = _linkedin_post_result(final_state)
+
+    except Exception as e:
+        result = {
             "success": False,
             "error": f"Error generating LinkedIn post: {str(e)}"
         }
+
+    result["metrics"] = finish_run(metrics)
+    yield {"type": "result", "result": result}
+
+
+async def agenerate_all_platforms(
+    chat_id: int,
+    raw_content: str,
+    user_request: str,
+    bypass_cache: bool = False,
+    source_id: str = None
+) -> Dict[str, Dict[str, Any]]:
+    """Run the LinkedIn and Medium workflows concurrently on the same source."""
+    # Index the source once up front so the two workflows don't race to do it.
+    source_id = await asyncio.to_thread(_resolve_source, chat_id, raw_content, source_id)
+    linkedin, medium = await asyncio.gather(
+        agenerate_linkedin_post(
+            chat_id, raw_content, user_request,
+            bypass_cache=bypass_cache, source_id=source_id
+        ),
+        agenerate_medium_blog(
+            chat_id, raw_content, user_request,
+            bypass_cache=bypass_cache, source_id=source_id
+        )
+    )
+    return {"LinkedIn": linkedin, "Medium": medium}
+
+
+def generate_all_platforms(
+    chat_id: int,
+    raw_content: str,
+    user_request: str,
+    bypass_cache: bool = False,
+    source_id: str = None
+) -> Dict[str, Dict[str, Any]]:
+    """Blocking entry point for agenerate_all_platforms (e.g. from a Streamlit run)."""
+    return run_async(agenerate_all_platforms(
+        chat_id, raw_content, user_request, bypass_cache, source_id
+    ))
@@ -0,0 +1,253 @@
+"""Generate LinkedIn posts and Medium drafts for a folder of PDFs and a list of YouTube URLs.
+
+Sources are extracted in a process pool and generated with bounded
+concurrency. Each generation gets its own chat, holding the source and the
+result, so drafts can be reviewed and refined in the UI. One JSON line per
+generation goes to --output; finished generations are appended to the
+checkpoint file, and a rerun with the same checkpoint skips them.
+
+    python batch_generate.py --pdf-dir sources/ --urls videos.txt --output batch.jsonl
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from Extraction import extract_source
+from MongoData import create_new_chat, save_message, indexing_queue
+from Workflow import generate_linkedin_post, generate_medium_blog
+
+PLATFORMS = ["LinkedIn", "Medium"]
+DEFAULT_REQUESTS = {
+    "LinkedIn": "Write an engaging LinkedIn post about the key ideas in this content",
+    "Medium": "Write a Medium blog post about the key ideas in this content"
+}
+
+
+def collect_sources(pdf_dir=None, urls_file=None):
+    """(kind, location) for every PDF under pdf_dir and every URL in urls_file."""
+    sources = []
+    if pdf_dir:
+        pattern = os.path.join(pdf_dir, "**", "*.pdf")
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            sources.append(("pdf", os.path.abspath(path)))
+    if urls_file:
+        with open(urls_file, encoding="utf-8") as f:
+            for line in f:
+                url = line.strip()
+                if url and not url.startswith("#"):
+                    sources.append(("youtube", url))
+    return sources
+
+
+def source_name(kind, location):
+    return os.path.basename(location) if kind == "pdf" else location
+
+
+def task_key(kind, location, platform):
+    return f"{kind}:{location}|{platform}"
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def generate(kind, location, platform, text, user_request, bypass_cache):
+    """Create a chat for the source, run the platform's workflow and save the result to it."""
+    name = source_name(kind, location)
+    start = time.perf_counter()
+    chat_id = create_new_chat(f"Batch: {name}", platform)
+    source_message = save_message(
+        chat_id,
+        "user",
+        f"📎 Batch source: **{name}**",
+        platform=platform,
+        source=name,
+        extracted_content=text
+    )
+    source_id = source_message["source_id"]
+
+    if platform == "Medium":
+        result = generate_medium_blog(
+            chat_id, text, user_request, platform,
+            bypass_cache=bypass_cache, source_id=source_id
+        )
+        content = result.get("final_blog")
+        heading = "## 🎉 Your Medium Blog is Ready!"
+    else:
+        result = generate_linkedin_post(
+            chat_id, text, user_request, platform,
+            bypass_cache=bypass_cache, source_id=source_id
+        )
+        content = result.get("final_post")
+        heading = "## 🎉 Your LinkedIn Post is Ready!"
+
+    if result["success"]:
+        save_message(chat_id, "assistant", f"{heading}\n\n{content}", platform=platform)
+    else:
+        save_message(chat_id, "assistant", f"❌ {result['error']}", platform=platform)
+
+    record = {key: value for key, value in result.items() if key != "workflow_messages"}
+    record.update({
+        "chat_id": chat_id,
+        "source_id": str(source_id),
+        "content": content,
+        "elapsed_s": time.perf_counter() - start
+    })
+    return record
+
+
+def run_batch(args):
+    sources = collect_sources(args.pdf_dir, args.urls)
+    checkpoint_path = args.checkpoint or args.output + ".checkpoint"
+    finished = load_checkpoint(checkpoint_path)
+
+    pending = {}
+    for kind, location in sources:
+        platforms = [p for p in args.platforms if task_key(kind, location, p) not in finished]
+        if platforms:
+            pending[(kind, location)] = platforms
+    total = sum(len(platforms) for platforms in pending.values())
+    skipped = len(sources) * len(args.platforms) - total
+    print(f"{len(sources)} sources, {total} generations to run, {skipped} already done")
+    if not total:
+        return 0
+
+    counts = {"succeeded": 0, "failed": 0}
+    done = 0
+    start = time.perf_counter()
+
+    # Spawned workers re-import the module of the submitted function, so
+    # extract_source lives in Extraction, which pulls in no Mongo, Chroma or
+    # LLM clients. It parses each PDF in-process: this pool is the only level
+    # of parallelism.
+    # Extracted texts wait in memory for a generation thread, so only a few
+    # sources per thread are extracted ahead; the rest start as these finish.
+    max_sources_in_flight = 2 * args.concurrency
+    extract_pool = ProcessPoolExecutor(
+        max_workers=min(args.extract_workers, max_sources_in_flight),
+        mp_context=multiprocessing.get_context("spawn")
+    )
+    generate_pool = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="batch-generate")
+    queued_sources = iter(pending)
+    unfinished = {}
+
+    with open(args.output, "a", encoding="utf-8") as output, \
+            open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+
+        def extract_more():
+            while len(unfinished) < max_sources_in_flight:
+                source = next(queued_sources, None)
+                if source is None:
+                    return
+                unfinished[source] = len(pending[source])
+                futures[extract_pool.submit(extract_source, *source)] = ("extract",) + source + (None,)
+
+        def finish(kind, location, platform, record):
+            nonlocal done
+            done += 1
+            unfinished[(kind, location)] -= 1
+            if not unfinished[(kind, location)]:
+                del unfinished[(kind, location)]
+            record.update({
+                "source": location,
+                "kind": kind,
+                "platform": platform,
+                "finished_at": datetime.utcnow().isoformat() + "Z"
+            })
+            output.write(json.dumps(record, default=str) + "\n")
+            output.flush()
+            if record["success"]:
+                # Only after the result line is written, so a crash in
+                # between reruns the item rather than losing it.
+                checkpoint.write(task_key(kind, location, platform) + "\n")
+                checkpoint.flush()
+                counts["succeeded"] += 1
+                status = f"ok in {record['elapsed_s']:.1f}s"
+            else:
+                counts["failed"] += 1
+                status = record["error"]
+            print(f"[{done}/{total}] {platform} {source_name(kind, location)}: {status}")
+
+        futures = {}
+        try:
+            extract_more()
+            while futures:
+                completed, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    stage, kind, location, platform = futures.pop(future)
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        outcome = f"Error {'extracting' if stage == 'extract' else 'generating'}: {e}"
+
+                    if stage == "extract":
+                        if outcome.startswith("Error") or not outcome.strip():
+                            for platform in pending[(kind, location)]:
+                                finish(kind, location, platform, {
+                                    "success": False,
+                                    "error": outcome or "Error: no text extracted",
+                                    "elapsed_s": 0.0
+                                })
+                            continue
+                        for platform in pending[(kind, location)]:
+                            user_request = args.request or DEFAULT_REQUESTS[platform]
+                            generation = generate_pool.submit(
+                                generate, kind, location, platform, outcome, user_request, args.bypass_cache
+                            )
+                            futures[generation] = ("generate", kind, location, platform)
+                    elif isinstance(outcome, str):
+                        finish(kind, location, platform, {"success": False, "error": outcome, "elapsed_s": 0.0})
+                    else:
+                        finish(kind, location, platform, outcome)
+                extract_more()
+        except KeyboardInterrupt:
+            print("Interrupted; finished generations are checkpointed and a rerun resumes from here.")
+            extract_pool.shutdown(wait=False, cancel_futures=True)
+            generate_pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            per_hour = counts["succeeded"] / elapsed * 3600 if elapsed else 0.0
+            print(
+                f"Generated {counts['succeeded']} of {total} items ({counts['failed']} failed) "
+                f"in {elapsed / 60:.1f} min: {per_hour:.1f} items/hour"
+            )
+
+    extract_pool.shutdown()
+    generate_pool.shutdown()
+    # Let the write-behind indexer finish so the new chats are searchable.
+    indexing_queue.flush(timeout=300)
+    return counts["failed"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf-dir", help="directory searched recursively for .pdf files")
+    parser.add_argument("--urls", help="file with one YouTube URL per line")
+    parser.add_argument("--platforms", nargs="+", choices=PLATFORMS, default=PLATFORMS)
+    parser.add_argument("--request", help="instructions for every generation instead of the per-platform default")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--checkpoint", help="finished-generation list, default <output>.checkpoint")
+    parser.add_argument("--extract-workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--concurrency", type=int, default=4, help="generations running at once")
+    parser.add_argument("--bypass-cache", action="store_true", help="skip the LLM response cache")
+    args = parser.parse_args()
+
+    if not args.pdf_dir and not args.urls:
+        parser.error("give --pdf-dir, --urls or both")
+
+    failed = run_batch(args)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
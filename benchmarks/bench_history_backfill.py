@@ -0,0 +1,83 @@
+"""Chroma backfill cost for load_chat_history_to_store on synthetic chats.
+
+"per-message" replays the old loop (one collection.get existence check, one
+encode and one collection.add per message); "bulk" is the current
+implementation. "resync" re-runs bulk on an already indexed chat, which is
+what every chat click pays once the chat is in the store.
+
+    python benchmarks/bench_history_backfill.py --sizes 100 1000 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MongoData import ChromaVectorStore
+
+
+def synthetic_chat(size):
+    return [
+        {
+            "_id": f"{i:024x}",
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Synthetic message {i}: notes about topic {i % 37} and follow-up {i % 11}",
+            "timestamp": datetime.utcnow()
+        }
+        for i in range(size)
+    ]
+
+
+def per_message_backfill(store, chat_id, messages):
+    for msg in messages:
+        message_id = str(msg["_id"])
+        existing = store.collection.get(ids=[f"chat_{chat_id}_msg_{message_id}"])
+        if existing["ids"]:
+            continue
+        store.add_message_to_store(
+            chat_id=chat_id,
+            message_id=message_id,
+            role=msg["role"],
+            content=msg["content"]
+        )
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--skip-per-message-above", type=int, default=10000,
+                        help="skip the slow baseline for chats larger than this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ChromaVectorStore(persist_directory=tmp)
+
+        print(f"{'messages':>9} {'per-message s':>14} {'bulk s':>10} {'resync s':>10}")
+        for chat_id, size in enumerate(args.sizes, start=1):
+            messages = synthetic_chat(size)
+
+            baseline = "skipped"
+            if size <= args.skip_per_message_above:
+                store._embedding_cache.clear()
+                baseline = f"{timed(per_message_backfill, store, chat_id, messages):.3f}"
+                store.delete_chat_from_store(chat_id)
+
+            store._embedding_cache.clear()
+            bulk = timed(store.load_chat_history_to_store, chat_id, messages)
+            resync = timed(store.load_chat_history_to_store, chat_id, messages)
+            store.delete_chat_from_store(chat_id)
+
+            print(f"{size:>9} {baseline:>14} {bulk:>10.3f} {resync:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""First-request and after-idle LLM latency, unmanaged clients vs LLMClient.
+
+Runs against a fake Ollama that charges --load-time whenever the model has
+to be loaded and unloads it after --server-keep-alive seconds without a
+request (Ollama's default is 5 minutes; the bench shrinks it). "unmanaged"
+builds a plain ChatOllama the way Workflow did before LLMClient; "managed"
+preloads the model at startup and sends keep_alive with every request.
+
+    python benchmarks/bench_llm_client.py --load-time 1.0 --idle 3
+"""
+import argparse
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from langchain_core.messages import HumanMessage
+
+from fake_ollama import FakeOllamaServer
+import LLMClient
+
+PROMPT = "Write one sentence about launching a product newsletter."
+
+
+def timed_invoke(llm):
+    start = time.perf_counter()
+    llm.invoke([HumanMessage(content=PROMPT)])
+    return time.perf_counter() - start
+
+
+def run_variant(name, args):
+    with FakeOllamaServer(
+        latency=args.latency,
+        tokens_per_sec=args.tokens_per_sec,
+        completion_tokens=args.completion_tokens,
+        load_time=args.load_time,
+        default_keep_alive=args.server_keep_alive
+    ) as server:
+        startup = 0.0
+        if name == "unmanaged":
+            from langchain_ollama import ChatOllama
+
+            def make_llm(temperature):
+                return ChatOllama(model=LLMClient.DEFAULT_MODEL, temperature=temperature, base_url=server.base_url)
+        else:
+            LLMClient.clear_clients()
+            start = time.perf_counter()
+            LLMClient.preload(base_url=server.base_url)
+            startup = time.perf_counter() - start
+
+            def make_llm(temperature):
+                llm = LLMClient.get_llm(LLMClient.DEFAULT_MODEL, temperature, base_url=server.base_url)
+                return LLMClient.sized_llm(llm, PROMPT)
+
+        first = timed_invoke(make_llm(0.7))
+        steady = min(timed_invoke(make_llm(temperature)) for temperature in (0.7, 0.2, 0.7))
+        time.sleep(args.idle)
+        after_idle = timed_invoke(make_llm(0.7))
+        return {
+            "startup_s": startup,
+            "first_s": first,
+            "steady_s": steady,
+            "after_idle_s": after_idle,
+            "model_loads": server.loads,
+            "connections": len(server.connections),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--load-time", type=float, default=1.0)
+    parser.add_argument("--server-keep-alive", type=float, default=2.0)
+    parser.add_argument("--idle", type=float, default=3.0)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--tokens-per-sec", type=float, default=500.0)
+    parser.add_argument("--completion-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    print(f"{'variant':<10} {'startup s':>10} {'first s':>8} {'steady s':>9} {'after idle s':>13} {'loads':>6} {'conns':>6}")
+    for name in ("unmanaged", "managed"):
+        r = run_variant(name, args)
+        print(
+            f"{name:<10} {r['startup_s']:>10.3f} {r['first_s']:>8.3f} {r['steady_s']:>9.3f} "
+            f"{r['after_idle_s']:>13.3f} {r['model_loads']:>6} {r['connections']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
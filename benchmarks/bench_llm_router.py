@@ -0,0 +1,140 @@
+"""Throughput and failover of OllamaRouter over several fake Ollama servers.
+
+Each fake server generates --parallel requests at a time, like a single
+Ollama instance. --clients threads each play one chat (a sticky session)
+and send --requests requests. The suite runs with 1 backend and with
+--backends backends, then repeats the multi-backend run and kills one
+server halfway through.
+
+    python benchmarks/bench_llm_router.py --backends 3 --clients 6
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from langchain_core.messages import HumanMessage
+
+from fake_ollama import FakeOllamaServer
+import LLMClient
+
+
+class RecordingRouter(LLMClient.OllamaRouter):
+    """Remembers, per thread, the backend the last request went to."""
+
+    local = threading.local()
+
+    def acquire(self, session=None, exclude=()):
+        backend = super().acquire(session, exclude)
+        self.local.url = backend.url
+        return backend
+
+
+def run(servers, args, kill_after=None):
+    LLMClient.clear_clients()
+    # Admission control is measured in bench_llm_scheduler.py; here every
+    # client gets a slot so only the routing differs between runs.
+    LLMClient.scheduler = LLMClient.LLMScheduler(max_concurrency=args.clients)
+    LLMClient.router = RecordingRouter(
+        [server.base_url for server in servers], health_interval=args.health_interval
+    )
+    llm = LLMClient.get_llm(base_url=servers[0].base_url)
+    latencies = []
+    errors = Counter()
+    backends_by_session = defaultdict(list)
+    lock = threading.Lock()
+    completed = [0]
+
+    def client(session):
+        for i in range(args.requests):
+            start = time.perf_counter()
+            try:
+                LLMClient.routed_invoke(llm, [HumanMessage(content=f"chat {session} turn {i}")], session)
+            except Exception as e:
+                with lock:
+                    errors[type(e).__name__] += 1
+                continue
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                backends_by_session[session].append(RecordingRouter.local.url)
+                completed[0] += 1
+                if kill_after is not None and completed[0] == kill_after:
+                    servers[-1].kill()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(session,)) for session in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    sticky = [
+        sum(url == urls[0] for url in urls) / len(urls)
+        for urls in backends_by_session.values() if urls
+    ]
+    ordered = sorted(latencies)
+    return {
+        "throughput": len(latencies) / wall,
+        "p50": statistics.median(ordered) if ordered else 0.0,
+        "p95": ordered[int(len(ordered) * 0.95) - 1] if ordered else 0.0,
+        "errors": sum(errors.values()),
+        "sticky": statistics.mean(sticky) if sticky else 0.0,
+        "distribution": [b["requests"] for b in LLMClient.router.stats()],
+        "healthy": [b["healthy"] for b in LLMClient.router.stats()],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", type=int, default=3)
+    parser.add_argument("--clients", type=int, default=6)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--parallel", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--tokens-per-sec", type=float, default=400.0)
+    parser.add_argument("--completion-tokens", type=int, default=16)
+    parser.add_argument("--health-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    def start_servers(count):
+        return [
+            FakeOllamaServer(
+                latency=args.latency,
+                tokens_per_sec=args.tokens_per_sec,
+                completion_tokens=args.completion_tokens,
+                parallel=args.parallel
+            ).start()
+            for _ in range(count)
+        ]
+
+    print(f"{'scenario':<22} {'req/s':>7} {'p50 s':>7} {'p95 s':>7} {'errors':>7} {'sticky':>7}  requests per backend / healthy")
+    total = args.clients * args.requests
+    for name, count, kill_after in (
+        ("1 backend", 1, None),
+        (f"{args.backends} backends", args.backends, None),
+        (f"{args.backends} backends, 1 killed", args.backends, total // 2),
+    ):
+        servers = start_servers(count)
+        try:
+            r = run(servers, args, kill_after)
+        finally:
+            for server in servers:
+                if not server.down:
+                    server.stop()
+        print(
+            f"{name:<22} {r['throughput']:>7.1f} {r['p50']:>7.3f} {r['p95']:>7.3f} {r['errors']:>7} "
+            f"{r['sticky']:>7.0%}  {r['distribution']} / {r['healthy']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Chat reply latency while generations keep Ollama busy, with and without LLMScheduler.
+
+One fake server generates --parallel requests at a time. --generations
+threads each run a --stages stage generation of --generation-tokens tokens
+per stage, while a chat thread sends --chats short replies of --chat-tokens
+tokens one after another. Without admission control every request goes
+straight to the server and a reply waits behind whatever generations got
+there first; with it at most --parallel requests are in flight and replies
+are admitted ahead of queued generation stages.
+
+    python benchmarks/bench_llm_scheduler.py --parallel 2 --generations 6
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from langchain_core.messages import HumanMessage
+from langchain_ollama import ChatOllama
+
+from fake_ollama import FakeOllamaServer
+import LLMClient
+import Metrics
+
+
+class QueueSink(Metrics.MetricsSink):
+    def __init__(self):
+        self.waits = defaultdict(list)
+
+    def observe_llm_queue(self, labels, priority, wait_seconds, service_seconds):
+        self.waits[priority].append(wait_seconds)
+
+
+def percentiles(values):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0, 0.0
+    return statistics.median(ordered), ordered[max(0, int(round(len(ordered) * 0.95)) - 1)]
+
+
+def run(server, args, max_concurrency):
+    LLMClient.clear_clients()
+    LLMClient.router = LLMClient.OllamaRouter([server.base_url])
+    LLMClient.scheduler = LLMClient.LLMScheduler(max_concurrency=max_concurrency)
+    sink = QueueSink()
+    Metrics.add_sink(sink)
+
+    def model(tokens):
+        return ChatOllama(model=LLMClient.DEFAULT_MODEL, num_predict=tokens, base_url=server.base_url)
+
+    generation_llm = model(args.generation_tokens)
+    chat_llm = model(args.chat_tokens)
+    chat_latencies = []
+    generation_times = []
+    lock = threading.Lock()
+    busy = threading.Event()
+
+    def generation(index):
+        start = time.perf_counter()
+        for stage in range(args.stages):
+            LLMClient.routed_invoke(
+                generation_llm, [HumanMessage(content=f"generation {index} stage {stage}")],
+                session=f"generation-{index}", priority=LLMClient.PRIORITY_GENERATION
+            )
+            busy.set()
+        with lock:
+            generation_times.append(time.perf_counter() - start)
+
+    def chat():
+        busy.wait()
+        for turn in range(args.chats):
+            start = time.perf_counter()
+            LLMClient.routed_invoke(
+                chat_llm, [HumanMessage(content=f"chat turn {turn}")],
+                session="chat", priority=LLMClient.PRIORITY_INTERACTIVE
+            )
+            chat_latencies.append(time.perf_counter() - start)
+            time.sleep(args.chat_interval)
+
+    threads = [threading.Thread(target=generation, args=(i,)) for i in range(args.generations)]
+    threads.append(threading.Thread(target=chat))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    Metrics.get_sinks().remove(sink)
+
+    return {
+        "chat": percentiles(chat_latencies),
+        "chat_wait": percentiles(sink.waits["interactive"]),
+        "generation": percentiles(generation_times),
+        "wall": wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--parallel", type=int, default=2, help="generations the fake server runs at once")
+    parser.add_argument("--generations", type=int, default=6)
+    parser.add_argument("--stages", type=int, default=3)
+    parser.add_argument("--generation-tokens", type=int, default=100)
+    parser.add_argument("--chats", type=int, default=8)
+    parser.add_argument("--chat-tokens", type=int, default=10)
+    parser.add_argument("--chat-interval", type=float, default=0.2)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    args = parser.parse_args()
+
+    print(f"{'scenario':<26} {'chat p50':>9} {'chat p95':>9} {'queued p95':>11} {'gen p50':>8} {'gen p95':>8} {'wall s':>7}")
+    for name, max_concurrency in (
+        ("no admission control", args.generations + 1),
+        (f"scheduler, {args.parallel} slots", args.parallel),
+    ):
+        with FakeOllamaServer(
+            latency=args.latency, tokens_per_sec=args.tokens_per_sec, parallel=args.parallel
+        ) as server:
+            r = run(server, args, max_concurrency)
+        print(
+            f"{name:<26} {r['chat'][0]:>9.3f} {r['chat'][1]:>9.3f} {r['chat_wait'][1]:>11.3f} "
+            f"{r['generation'][0]:>8.2f} {r['generation'][1]:>8.2f} {r['wall']:>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""PDF extraction: old serial concatenation vs the parallel page engine.
+
+Builds synthetic text PDFs in memory and reports total time and time to the
+first page for the pre-engine loop and for iter_pdf_pages with 1 and N
+worker processes.
+
+    python benchmarks/bench_pdf_extraction.py --pages 200 600
+"""
+import argparse
+import os
+import sys
+import time
+from io import BytesIO
+
+import PyPDF2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Extraction import iter_pdf_pages
+
+
+def make_synthetic_pdf(pages: int, lines_per_page: int = 40) -> bytes:
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page in range(pages):
+        lines = [
+            f"({'Page %d line %d: synthetic report text about quarterly results.' % (page + 1, line)}) Tj T*"
+            for line in range(lines_per_page)
+        ]
+        stream = ("BT /F1 10 Tf 12 TL 40 760 Td " + " ".join(lines) + " ET").encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    out = BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def legacy_extract(pdf_bytes):
+    pdf_reader = PyPDF2.PdfReader(BytesIO(pdf_bytes))
+    text_content = ""
+    for page in pdf_reader.pages:
+        text_content += page.extract_text() + "\n"
+    return text_content.strip()
+
+
+def engine_extract(pdf_bytes, workers):
+    start = time.perf_counter()
+    first_page = None
+    pages = []
+    for _, _, text in iter_pdf_pages(pdf_bytes, max_workers=workers):
+        if first_page is None:
+            first_page = time.perf_counter() - start
+        pages.append(text)
+    return "\n".join(pages).strip(), first_page
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[200, 600])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} {'variant':<12} {'total s':>9} {'first page s':>13}")
+    for pages in args.pages:
+        pdf_bytes = make_synthetic_pdf(pages)
+
+        start = time.perf_counter()
+        expected = legacy_extract(pdf_bytes)
+        legacy_total = time.perf_counter() - start
+        print(f"{pages:>6} {'legacy':<12} {legacy_total:>9.3f} {legacy_total:>13.3f}")
+
+        for workers in sorted({1, args.workers}):
+            start = time.perf_counter()
+            text, first_page = engine_extract(pdf_bytes, workers)
+            total = time.perf_counter() - start
+            assert text == expected, "engine output differs from legacy extraction"
+            print(f"{pages:>6} {f'{workers} worker(s)':<12} {total:>9.3f} {first_page:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
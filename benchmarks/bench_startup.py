@@ -0,0 +1,96 @@
+"""Cold-start cost: module import time and latency of the first request.
+
+Each measurement runs in a fresh interpreter so nothing is already imported
+or loaded. "cold" issues the first context lookup right after import;
+"warmed" calls vector_store.warm_up() at import and waits --think-time
+seconds first, which is what a Streamlit worker gets while the user reads
+the page before sending a prompt.
+
+    python benchmarks/bench_startup.py --runs 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"import_s": time.perf_counter() - start}}))
+"""
+
+FIRST_REQUEST_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import MongoData
+from MongoData import ChromaVectorStore
+imported = time.perf_counter() - start
+store = ChromaVectorStore(persist_directory={persist_directory!r})
+if {warm}:
+    store.warm_up()
+    time.sleep({think_time})
+start = time.perf_counter()
+store.get_relevant_context(chat_id=1, query="What did we decide about the launch post?")
+print(json.dumps({{"import_s": imported, "first_request_s": time.perf_counter() - start}}))
+"""
+
+
+def run_snippet(code):
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True, capture_output=True, text=True, cwd=ROOT
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--think-time", type=float, default=2.0)
+    parser.add_argument("--modules", nargs="+", default=["Extraction", "MongoData", "Workflow"])
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for module in args.modules:
+        runs = [run_snippet(IMPORT_SNIPPET.format(root=ROOT, module=module)) for _ in range(args.runs)]
+        results[f"import {module}"] = {"import_s": median(run["import_s"] for run in runs)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for warm in (False, True):
+            runs = [
+                run_snippet(FIRST_REQUEST_SNIPPET.format(
+                    root=ROOT, persist_directory=tmp, warm=warm, think_time=args.think_time
+                ))
+                for _ in range(args.runs)
+            ]
+            results["first request (warmed)" if warm else "first request (cold)"] = {
+                "import_s": median(run["import_s"] for run in runs),
+                "first_request_s": median(run["first_request_s"] for run in runs),
+            }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'scenario':<26} {'import s':>9} {'first request s':>16}")
+    for name, timings in results.items():
+        first_request = timings.get("first_request_s")
+        first_request = f"{first_request:.3f}" if first_request is not None else "-"
+        print(f"{name:<26} {timings['import_s']:>9.3f} {first_request:>16}")
+
+
+if __name__ == "__main__":
+    main()
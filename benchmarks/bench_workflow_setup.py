@@ -0,0 +1,47 @@
+"""Per-request workflow setup cost, before and after the workflow registry.
+
+"before" clears the registry on every iteration, which reproduces the old
+behaviour of building a ChatOllama client and compiling the StateGraph for
+each request. "after" reuses the registry entry. No LLM calls are made.
+
+    python benchmarks/bench_workflow_setup.py --iterations 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Workflow import clear_registry, get_workflow
+
+
+def time_setup(platform, iterations, cold):
+    samples = []
+    clear_registry()
+    get_workflow(platform)
+    for _ in range(iterations):
+        if cold:
+            clear_registry()
+        start = time.perf_counter()
+        get_workflow(platform)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'platform':<10} {'mode':<7} {'mean ms':>10} {'p95 ms':>10}")
+    for platform in ("Medium", "LinkedIn"):
+        for mode, cold in (("before", True), ("after", False)):
+            samples = sorted(time_setup(platform, args.iterations, cold))
+            p95 = samples[int(len(samples) * 0.95) - 1]
+            print(f"{platform:<10} {mode:<7} {statistics.mean(samples):>10.3f} {p95:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Explain the hot Mongo queries and fail if any is not served by an index.
+
+Creates the indexes with ensure_indexes(), then runs explain() on the queries
+issued on every rerun / chat click / generation. A query fails the check when
+its winning plan contains a COLLSCAN or an in-memory SORT stage.
+
+    MONGO_URI=mongodb://localhost:27017/ python benchmarks/check_indexes.py
+"""
+import os
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MongoData import chats_collection, ensure_indexes, messages_collection
+
+
+def hot_queries(chat_id):
+    return {
+        "get_chat_messages": messages_collection.find(
+            {"chat_id": chat_id}
+        ).sort([("timestamp", 1), ("_id", 1)]),
+        "get_chat_messages_page": messages_collection.find(
+            {"chat_id": chat_id},
+            {"extracted_content": 0}
+        ).sort([("timestamp", -1), ("_id", -1)]).limit(51),
+        "latest_extracted_content": messages_collection.find(
+            {"chat_id": chat_id, "extracted_content": {"$exists": True}}
+        ).sort("timestamp", -1).limit(1),
+        "sync_after_watermark": messages_collection.find(
+            {"chat_id": chat_id, "_id": {"$gt": ObjectId("0" * 24)}},
+            {"role": 1, "content": 1}
+        ).sort("_id", 1),
+        "sidebar_chats": chats_collection.find(
+            {},
+            {"_id": 1, "chat_name": 1, "platform": 1, "updated_at": 1}
+        ).sort("updated_at", -1),
+        "sidebar_page": chats_collection.find(
+            {"$or": [
+                {"updated_at": {"$lt": datetime(2030, 1, 1)}},
+                {"updated_at": datetime(2030, 1, 1), "_id": {"$lt": 1000}}
+            ]},
+            {"_id": 1, "chat_name": 1, "platform": 1, "updated_at": 1}
+        ).sort([("updated_at", -1), ("_id", -1)]).limit(31),
+        "sidebar_search": chats_collection.find(
+            {"chat_name": {"$regex": "^market", "$options": "i"}, "platform": "Medium"},
+            {"_id": 1, "chat_name": 1, "platform": 1, "updated_at": 1}
+        ).sort([("updated_at", -1), ("_id", -1)]).limit(31),
+    }
+
+
+def plan_stages(plan):
+    stages = [plan.get("stage")]
+    for child in plan.get("inputStages", []) + [plan.get("inputStage")]:
+        if child:
+            stages.extend(plan_stages(child))
+    return stages
+
+
+def main():
+    ensure_indexes()
+    failures = 0
+
+    for name, cursor in hot_queries(chat_id=1).items():
+        winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        stages = plan_stages(winning_plan.get("queryPlan", winning_plan))
+        ok = "COLLSCAN" not in stages and "SORT" not in stages
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name:<26} {' <- '.join(filter(None, stages))}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Local stand-in for the Ollama HTTP API with controllable speed.
+
+Serves /api/chat and /api/generate (streaming NDJSON or a single JSON reply)
+and /api/tags. Every reply waits --latency seconds before the first token
+and then emits --completion-tokens tokens (or the request's num_predict)
+at --tokens-per-sec, and reports Ollama-style eval counts and durations in
+the final chunk.
+
+Like Ollama, a request first pays --load-time when its model is not loaded,
+when the loaded model has a different num_ctx, or when the model's
+keep_alive (the request's, else --default-keep-alive seconds) has run out.
+A generate request without a prompt only loads the model. With --parallel,
+at most that many requests generate at once and the rest queue, like
+OLLAMA_NUM_PARALLEL.
+
+    python benchmarks/fake_ollama.py --port 11434 --latency 0.2 --tokens-per-sec 40
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOllamaServer:
+    """Threaded fake Ollama server; use as a context manager or start()/stop()."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.05,
+        tokens_per_sec: float = 200.0,
+        completion_tokens: int = 64,
+        load_time: float = 0.0,
+        default_keep_alive: float = 300.0,
+        parallel: int = 0
+    ):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.completion_tokens = completion_tokens
+        self.load_time = load_time
+        self.default_keep_alive = default_keep_alive
+        self._slots = threading.BoundedSemaphore(parallel) if parallel else None
+        self.down = False
+        self.requests = 0
+        self.loads = 0
+        self.connections = set()
+        self._loaded = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-ollama", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def kill(self):
+        """Simulate a crashed server: drop open connections and refuse new ones."""
+        self.down = True
+        self.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _count_request(self, client_address):
+        with self._lock:
+            self.requests += 1
+            self.connections.add(client_address)
+
+    def _keep_alive_seconds(self, value):
+        if value is None:
+            return self.default_keep_alive
+        if isinstance(value, (int, float)):
+            return float(value)
+        match = re.fullmatch(r"(-?[\d.]+)(ms|s|m|h)?", str(value).strip())
+        if not match:
+            return self.default_keep_alive
+        scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}[match.group(2)]
+        return float(match.group(1)) * scale
+
+    def _ensure_loaded(self, request) -> float:
+        """Sleep for the load time if the model has to be (re)loaded; returns it."""
+        model = request.get("model")
+        num_ctx = (request.get("options") or {}).get("num_ctx")
+        keep_alive = self._keep_alive_seconds(request.get("keep_alive"))
+        now = time.monotonic()
+        with self._lock:
+            loaded = self._loaded.get(model)
+            reload = loaded is None or loaded[0] != num_ctx or loaded[1] < now
+            if reload:
+                self.loads += 1
+        load_seconds = self.load_time if reload else 0.0
+        time.sleep(load_seconds)
+        expires = float("inf") if keep_alive < 0 else time.monotonic() + keep_alive
+        with self._lock:
+            self._loaded[model] = (num_ctx, expires)
+        return load_seconds
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, body):
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if server.down:
+                    self.close_connection = True
+                    return
+                self._send_json({"models": []})
+
+            def do_POST(self):
+                if server.down:
+                    self.close_connection = True
+                    return
+                if server._slots is None:
+                    self._generate()
+                    return
+                with server._slots:
+                    self._generate()
+
+            def _generate(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                server._count_request(self.client_address)
+                load_seconds = server._ensure_loaded(request)
+
+                chat = self.path.endswith("/chat")
+                if chat:
+                    prompt = " ".join(m.get("content", "") for m in request.get("messages", []))
+                else:
+                    prompt = request.get("prompt") or ""
+                prompt_tokens = len(prompt.split())
+                completion_tokens = (request.get("options") or {}).get("num_predict") or server.completion_tokens
+
+                def chunk(text, done, eval_seconds=0.0):
+                    body = {
+                        "model": request.get("model"),
+                        "created_at": "2024-01-01T00:00:00Z",
+                        "done": done,
+                    }
+                    if chat:
+                        body["message"] = {"role": "assistant", "content": text}
+                    else:
+                        body["response"] = text
+                    if done:
+                        body.update({
+                            "done_reason": "stop",
+                            "prompt_eval_count": prompt_tokens,
+                            "prompt_eval_duration": int(server.latency * 1e9),
+                            "eval_count": completion_tokens,
+                            "eval_duration": int(eval_seconds * 1e9),
+                            "load_duration": int(load_seconds * 1e9),
+                            "total_duration": int((load_seconds + server.latency + eval_seconds) * 1e9),
+                        })
+                    return body
+
+                if not chat and not prompt:
+                    body = chunk("", True)
+                    body.update({"done_reason": "load", "load_duration": int(load_seconds * 1e9)})
+                    self._send_json(body)
+                    return
+
+                time.sleep(server.latency)
+                tokens = [f"tok{i} " for i in range(completion_tokens)]
+                delay = 1.0 / server.tokens_per_sec if server.tokens_per_sec > 0 else 0.0
+
+                if request.get("stream") is False:
+                    start = time.perf_counter()
+                    time.sleep(delay * len(tokens))
+                    body = chunk("".join(tokens), True, time.perf_counter() - start)
+                    self._send_json(body)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def send(body):
+                    data = (json.dumps(body) + "\n").encode()
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                    self.wfile.flush()
+
+                start = time.perf_counter()
+                for token in tokens:
+                    time.sleep(delay)
+                    send(chunk(token, False))
+                send(chunk("", True, time.perf_counter() - start))
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--load-time", type=float, default=0.0, help="seconds to load a model")
+    parser.add_argument("--default-keep-alive", type=float, default=300.0,
+                        help="seconds a model stays loaded when requests set no keep_alive")
+    parser.add_argument("--parallel", type=int, default=0, help="concurrent generations, 0 for unlimited")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        tokens_per_sec=args.tokens_per_sec,
+        completion_tokens=args.completion_tokens,
+        load_time=args.load_time,
+        default_keep_alive=args.default_keep_alive,
+        parallel=args.parallel
+    )
+    print(f"Fake Ollama listening on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
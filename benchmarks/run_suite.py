@@ -0,0 +1,267 @@
+"""Offline benchmark suite for the main code paths, with JSON output.
+
+Runs every scenario at several data sizes against the stand-ins in
+stand_ins.py (fake Ollama, mongomock or a local mongod, temp-dir Chroma and
+a hash embedding), and writes one JSON document with the timings, the git
+commit and the parameters. --compare prints the change in mean time against
+an earlier run.
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/run_suite.py --output bench.json
+    python benchmarks/run_suite.py --compare bench.json --scenarios save_message
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+import stand_ins
+
+WORDS = (
+    "content strategy audience launch engagement growth metrics story insight "
+    "product design team research customer data model release feedback market "
+    "channel brand writing draft outline summary example practice lesson"
+).split()
+
+
+def synthetic_text(chars, seed):
+    rng = random.Random(seed)
+    sentences = []
+    length = 0
+    while length < chars:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 18))).capitalize() + "."
+        sentences.append(sentence)
+        length += len(sentence) + 1
+        if rng.random() < 0.15:
+            sentences.append("\n\n")
+    return " ".join(sentences)[:chars]
+
+
+def new_chat(name, platform="Medium"):
+    from MongoData import create_new_chat
+    return create_new_chat(name, platform)
+
+
+def seed_history(chat_id, size):
+    from MongoData import indexing_queue, save_messages
+    save_messages(chat_id, [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": synthetic_text(200, seed=chat_id * 100003 + i),
+            "platform": "Medium"
+        }
+        for i in range(size)
+    ])
+    indexing_queue.flush(timeout=300)
+
+
+# Each scenario takes (size, repeat) and returns the elapsed seconds for one
+# sample; setup that is not part of the measured path happens before the clock.
+
+def bench_generate_medium_blog(size, repeat):
+    from Workflow import generate_medium_blog
+    chat_id = new_chat(f"medium {size} {repeat}")
+    source = synthetic_text(size, seed=repeat)
+    start = time.perf_counter()
+    result = generate_medium_blog(chat_id, source, "Write a blog post about this", bypass_cache=True)
+    elapsed = time.perf_counter() - start
+    assert result["success"], result.get("error")
+    return elapsed
+
+
+def bench_generate_linkedin_post(size, repeat):
+    from Workflow import generate_linkedin_post
+    chat_id = new_chat(f"linkedin {size} {repeat}", "LinkedIn")
+    source = synthetic_text(size, seed=repeat)
+    start = time.perf_counter()
+    result = generate_linkedin_post(chat_id, source, "Write a LinkedIn post about this", "LinkedIn", bypass_cache=True)
+    elapsed = time.perf_counter() - start
+    assert result["success"], result.get("error")
+    return elapsed
+
+
+def bench_process_user_message(size, repeat):
+    from MongoData import vector_store
+    from Workflow import process_user_message_with_context
+    chat_id = new_chat(f"chat {size} {repeat}")
+    seed_history(chat_id, size)
+    vector_store.sync_chat_to_store(chat_id)
+    start = time.perf_counter()
+    reply = process_user_message_with_context(
+        chat_id, "What did we decide about the launch story?", bypass_cache=True
+    )
+    elapsed = time.perf_counter() - start
+    assert not reply.startswith("Error"), reply
+    return elapsed
+
+
+def bench_save_message(size, repeat):
+    from MongoData import indexing_queue, save_message
+    chat_id = new_chat(f"save {size} {repeat}")
+    contents = [synthetic_text(200, seed=repeat * 100003 + i) for i in range(size)]
+    start = time.perf_counter()
+    for i, content in enumerate(contents):
+        save_message(chat_id, "user" if i % 2 == 0 else "assistant", content, platform="Medium")
+    indexing_queue.flush(timeout=300)
+    return time.perf_counter() - start
+
+
+def bench_load_chat_history(size, repeat):
+    from MongoData import get_chat_messages, vector_store
+    chat_id = new_chat(f"history {size} {repeat}")
+    seed_history(chat_id, size)
+    messages = get_chat_messages(chat_id)
+    vector_store.delete_chat_from_store(chat_id)
+    vector_store._embedding_cache.clear()
+    start = time.perf_counter()
+    vector_store.load_chat_history_to_store(chat_id, messages)
+    return time.perf_counter() - start
+
+
+def bench_extract_pdf_content(size, repeat):
+    from bench_pdf_extraction import make_synthetic_pdf
+    from Workflow import extract_pdf_content
+    pdf_bytes = make_synthetic_pdf(size)
+    start = time.perf_counter()
+    text = extract_pdf_content(io.BytesIO(pdf_bytes))
+    elapsed = time.perf_counter() - start
+    assert not text.startswith("Error"), text
+    return elapsed
+
+
+SCENARIOS = {
+    "generate_medium_blog": (bench_generate_medium_blog, "source chars", [2000, 12000]),
+    "generate_linkedin_post": (bench_generate_linkedin_post, "source chars", [2000, 12000]),
+    "process_user_message_with_context": (bench_process_user_message, "history messages", [10, 500]),
+    "save_message": (bench_save_message, "messages saved", [100, 1000]),
+    "load_chat_history_to_store": (bench_load_chat_history, "history messages", [100, 1000]),
+    "extract_pdf_content": (bench_extract_pdf_content, "pages", [20, 200]),
+}
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "samples_s": samples,
+        "mean_s": statistics.mean(samples),
+        "p50_s": statistics.median(samples),
+        "p95_s": ordered[max(0, int(round(len(ordered) * 0.95)) - 1)],
+        "min_s": ordered[0],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["scenario"], r["size"]): r for r in json.load(f)["results"]}
+    print(f"{'scenario':<36} {'size':>7} {'base s':>9} {'now s':>9} {'change':>8}", file=sys.stderr)
+    for result in results:
+        before = baseline.get((result["scenario"], result["size"]))
+        if not before:
+            continue
+        change = result["mean_s"] / before["mean_s"] - 1 if before["mean_s"] else 0.0
+        print(
+            f"{result['scenario']:<36} {result['size']:>7} {before['mean_s']:>9.3f} "
+            f"{result['mean_s']:>9.3f} {change:>+8.1%}",
+            file=sys.stderr
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs per scenario and size")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every data size")
+    parser.add_argument("--mongo-uri", help="use this mongod instead of mongomock")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake Ollama time to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    env = stand_ins.install(
+        mongo_uri=args.mongo_uri,
+        latency=args.latency,
+        tokens_per_sec=args.tokens_per_sec,
+        completion_tokens=args.completion_tokens
+    )
+    results = []
+    try:
+        for name in args.scenarios:
+            bench, unit, sizes = SCENARIOS[name]
+            for size in sizes:
+                size = max(1, int(size * args.scale))
+                with contextlib.redirect_stdout(sys.stderr):
+                    for warmup in range(args.warmup):
+                        bench(size, -1 - warmup)
+                    requests_before = env.ollama.requests
+                    samples = [bench(size, repeat) for repeat in range(args.repeat)]
+                result = {
+                    "scenario": name,
+                    "size": size,
+                    "unit": unit,
+                    "llm_requests": (env.ollama.requests - requests_before) / args.repeat,
+                }
+                result.update(summarize(samples))
+                results.append(result)
+                print(
+                    f"{name:<36} {size:>7} {unit:<17} mean {result['mean_s']:.3f}s  p95 {result['p95_s']:.3f}s",
+                    file=sys.stderr
+                )
+    finally:
+        env.close()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mongo": args.mongo_uri and "mongod" or "mongomock",
+            "parameters": {
+                "repeat": args.repeat,
+                "warmup": args.warmup,
+                "scale": args.scale,
+                "latency": args.latency,
+                "tokens_per_sec": args.tokens_per_sec,
+                "completion_tokens": args.completion_tokens,
+            },
+        },
+        "results": results,
+    }
+
+    if args.compare:
+        compare(results, args.compare)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
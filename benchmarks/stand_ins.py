@@ -0,0 +1,100 @@
+"""Offline stand-ins for the services MongoData and Workflow talk to.
+
+install() must run before MongoData or Workflow is imported: it points them
+at a fake Ollama server, a throwaway Chroma directory and either mongomock
+or a local mongod, and gives the vector store a deterministic embedding
+model so no HuggingFace download is needed. mongomock comes from
+benchmarks/requirements.txt.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+
+from fake_ollama import FakeOllamaServer
+
+BENCH_DB = "socialmedia_app_bench"
+
+
+class HashEmbedding:
+    """Tiny deterministic bag-of-words embedding with a SentenceTransformer-style encode."""
+
+    def __init__(self, dimensions: int = 64):
+        self.dimensions = dimensions
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        if isinstance(texts, str):
+            return self._embed(texts)
+        return np.stack([self._embed(text) for text in texts]) if texts else np.zeros((0, self.dimensions), dtype=np.float32)
+
+
+class StandIns:
+    """Handles to the running stand-ins; close() stops and removes them."""
+
+    def __init__(self, ollama, workdir, mongo_uri):
+        self.ollama = ollama
+        self.workdir = workdir
+        self.mongo_uri = mongo_uri
+
+    def close(self):
+        import MongoData
+
+        MongoData.indexing_queue.shutdown()
+        if self.mongo_uri:
+            MongoData.client.drop_database(BENCH_DB)
+        self.ollama.stop()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def install(
+    mongo_uri: str = None,
+    latency: float = 0.05,
+    tokens_per_sec: float = 200.0,
+    completion_tokens: int = 64,
+    embedding_dimensions: int = 64
+) -> StandIns:
+    """Start the stand-ins and import MongoData/Workflow against them.
+
+    With ``mongo_uri`` the benchmark uses that mongod (in a separate
+    database that is dropped on close); otherwise mongomock.
+    """
+    ollama = FakeOllamaServer(
+        latency=latency,
+        tokens_per_sec=tokens_per_sec,
+        completion_tokens=completion_tokens
+    ).start()
+    workdir = tempfile.mkdtemp(prefix="bench-")
+
+    os.environ["OLLAMA_BASE_URL"] = ollama.base_url
+    os.environ["OLLAMA_BASE_URLS"] = ollama.base_url
+    os.environ["CHROMA_PERSIST_DIR"] = os.path.join(workdir, "chroma")
+    os.environ["MONGO_DB"] = BENCH_DB
+    os.environ.pop("LLM_CACHE_DB", None)
+
+    if mongo_uri:
+        os.environ["MONGO_URI"] = mongo_uri
+    else:
+        import mongomock
+        import mongomock.gridfs
+        import pymongo
+
+        mongomock.gridfs.enable_gridfs_integration()
+        pymongo.MongoClient = mongomock.MongoClient
+
+    import MongoData
+    import Workflow  # noqa: F401  (LLMClient reads OLLAMA_BASE_URL at import)
+
+    MongoData.vector_store.embedding_model = HashEmbedding(embedding_dimensions)
+    return StandIns(ollama, workdir, mongo_uri)
@@ -1,15 +1,23 @@
+import time
 import streamlit as st
 from datetime import datetime
-from Workflow import (extract_pdf_content, extract_youtube_transcript,generate_medium_blog,
-    generate_linkedin_post,
-    process_user_message_with_context
+from Workflow import (extract_pdf_content, extract_youtube_transcript,
+    stream_user_message_with_context
 )
+from Jobs import (JOB_PLATFORMS, FINISHED_STATUSES,
+    submit_job, get_job, get_active_job,
+    start_workers, start_api
+)
+from LLMClient import warm_up as warm_up_llm
 from MongoData import (create_new_chat, 
-    save_message, 
-    get_all_chats, 
-    get_chat_messages, delete_chat, 
-    chats_collection, 
-    messages_collection,vector_store,
+    ensure_indexes,
+    save_message,
+    list_chats, 
+    get_chat_messages_page, delete_chat, 
+    get_active_source,
+    read_source_text,
+    get_chat_info,
+    vector_store,
     get_or_load_chat_context
 )
 
@@ -19,14 +27,34 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource
+def bootstrap_database():
+    # Load the embedding model, Chroma and the Ollama model while the first
+    # page renders. Job workers live for the whole server process, so a
+    # generation keeps running across reruns and reloads.
+    vector_store.warm_up()
+    warm_up_llm()
+    ensure_indexes()
+    start_workers()
+    start_api()
+
+
+bootstrap_database()
+
 if "current_chat_id" not in st.session_state:
     st.session_state.current_chat_id = None
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "has_older_messages" not in st.session_state:
+    st.session_state.has_older_messages = False
+if "has_newer_messages" not in st.session_state:
+    st.session_state.has_newer_messages = False
 if "show_new_chat_dialog" not in st.session_state:
     st.session_state.show_new_chat_dialog = False
 if "show_upload_dialog" not in st.session_state:
     st.session_state.show_upload_dialog = False
+if "chat_page_cursors" not in st.session_state:
+    st.session_state.chat_page_cursors = [None]
 
 st.markdown("""
 <style>
@@ -103,10 +131,128 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_WINDOW = 3 * MESSAGE_PAGE_SIZE
+
+
+def show_latest_messages(chat_id):
+    messages, has_more = get_chat_messages_page(chat_id, limit=MESSAGE_PAGE_SIZE)
+    st.session_state.messages = messages
+    st.session_state.has_older_messages = has_more
+    st.session_state.has_newer_messages = False
+
+
+def load_older_messages(chat_id):
+    oldest = st.session_state.messages[0]
+    older, has_more = get_chat_messages_page(
+        chat_id,
+        before=(oldest["timestamp"], oldest["_id"]),
+        limit=MESSAGE_PAGE_SIZE
+    )
+    messages = older + st.session_state.messages
+    st.session_state.has_older_messages = has_more
+    if len(messages) > MESSAGE_WINDOW:
+        messages = messages[:MESSAGE_WINDOW]
+        st.session_state.has_newer_messages = True
+    st.session_state.messages = messages
+
+
+def append_message(message):
+    if st.session_state.has_newer_messages:
+        show_latest_messages(st.session_state.current_chat_id)
+        return
+    st.session_state.messages.append(message)
+    if len(st.session_state.messages) > MESSAGE_WINDOW:
+        st.session_state.messages = st.session_state.messages[-MESSAGE_WINDOW:]
+        st.session_state.has_older_messages = True
+
+
+CHAT_PAGE_SIZE = 30
+PLATFORM_FILTERS = ["All platforms", "LinkedIn", "Medium"]
+
+
+def reset_chat_pages():
+    st.session_state.chat_page_cursors = [None]
+
+
 def load_chat_with_context(chat_id):
-    db_messages = get_chat_messages(chat_id)
-    vector_store.load_chat_history_to_store(chat_id)
-    return db_messages
+    show_latest_messages(chat_id)
+    vector_store.sync_chat_to_store(chat_id)
+
+
+def render_stream(events):
+    status = st.status("🤔 Thinking...", expanded=True)
+    live_output = st.empty()
+    streamed_text = ""
+    result = None
+    queued = False
+
+    for event in events:
+        if event["type"] == "queued":
+            status.update(label=f"⏳ Queued behind other requests, position {event['position']}")
+            queued = True
+            continue
+        if queued:
+            status.update(label="🤔 Thinking...")
+            queued = False
+
+        if event["type"] == "token":
+            streamed_text += event["content"]
+            live_output.markdown(streamed_text + "▌")
+        elif event["type"] == "stage":
+            if event["message"]:
+                status.write(event["message"])
+            streamed_text = ""
+            live_output.empty()
+        elif event["type"] == "result":
+            result = event["result"]
+
+    live_output.empty()
+    status.update(label="✅ Done", state="complete", expanded=False)
+    return result
+
+JOB_REFRESH_SECONDS = 0.5
+
+
+def render_job(job):
+    """Follow a generation job until it finishes.
+
+    The job runs on a worker, so a rerun or reload only stops this view;
+    the next run picks the job up again from its record.
+    """
+    status = st.status("⏳ Waiting for a worker...", expanded=True)
+    live_output = st.empty()
+    shown_stages = 0
+
+    while True:
+        for stage in job["stages"][shown_stages:]:
+            if stage["message"]:
+                status.write(stage["message"])
+        shown_stages = len(job["stages"])
+        if job["status"] in FINISHED_STATUSES:
+            break
+
+        node = job.get("current_node")
+        if job["status"] == "queued":
+            status.update(label="⏳ Waiting for a worker...")
+        elif job["status"] == "finishing":
+            status.update(label="💾 Saving the result...")
+        elif job.get("queue_position"):
+            status.update(label=f"⏳ Queued behind other requests, position {job['queue_position']}")
+        else:
+            status.update(label="🤔 Thinking...")
+        live_output.markdown(job["outputs"].get(node, "") + "▌" if node else "")
+
+        time.sleep(JOB_REFRESH_SECONDS)
+        job = get_job(job["_id"])
+        if job is None:
+            break
+
+    live_output.empty()
+    if job is not None and job["status"] == "failed":
+        status.update(label="❌ Failed", state="error", expanded=False)
+    else:
+        status.update(label="✅ Done", state="complete", expanded=False)
 
 @st.dialog("Create New Chat")
 def new_chat_dialog():
@@ -126,9 +272,12 @@ def new_chat_dialog():
         if st.button("Create", use_container_width=True, type="primary"):
             if chat_name.strip():
                 new_chat_id = create_new_chat(chat_name.strip(), platform)
+                reset_chat_pages()
 
                 st.session_state.current_chat_id = new_chat_id
                 st.session_state.messages = []
+                st.session_state.has_older_messages = False
+                st.session_state.has_newer_messages = False
 
                 st.session_state.show_new_chat_dialog = False
                 st.rerun()
@@ -164,28 +313,24 @@ def upload_dialog():
             if uploaded_file:
 
                 with st.spinner("Extracting content from PDF..."):
-                    current_time = datetime.utcnow()
-                    extracted_text = extract_pdf_content(uploaded_file)
-                    current_chat = chats_collection.find_one({"_id": st.session_state.current_chat_id})
+                    progress = st.progress(0.0, text="Reading pages...")
+                    extracted_text = extract_pdf_content(
+                        uploaded_file,
+                        progress_callback=lambda done, total: progress.progress(
+                            done / total, text=f"Extracted page {done} of {total}"
+                        )
+                    )
+                    current_chat = get_chat_info(st.session_state.current_chat_id)
                     platform = current_chat.get("platform", "General") if current_chat else "General"
                     file_info = f"📎 Uploaded file: **{uploaded_file.name}** ({uploaded_file.size / 1024:.2f} KB)"
-                    save_message(
+                    append_message(save_message(
                         st.session_state.current_chat_id,
                         "user",
                         file_info,
                         platform=platform,
                         source=uploaded_file.name,
                         extracted_content=extracted_text
-                    )
-                    user_msg = {
-                        "role": "user",
-                        "content": file_info,
-                        "timestamp": current_time,
-                        "chat_id": st.session_state.current_chat_id,
-                        "source": uploaded_file.name,
-                        "file_type": uploaded_file.type
-                    }
-                    st.session_state.messages.append(user_msg)
+                    ))
                 
                 
                     assistant_response = f"""I've received your file **{uploaded_file.name}**. 
@@ -201,15 +346,7 @@ def upload_dialog():
 
 Just tell me what you need! 💡"""
                     
-                    save_message(st.session_state.current_chat_id, "assistant", assistant_response, platform=platform)
-                    
-                    assistant_msg = {
-                        "role": "assistant",
-                        "content": assistant_response,
-                        "timestamp": current_time,
-                        "chat_id": st.session_state.current_chat_id
-                    }
-                    st.session_state.messages.append(assistant_msg)
+                    append_message(save_message(st.session_state.current_chat_id, "assistant", assistant_response, platform=platform))
                     
                     st.session_state.show_upload_dialog = False
                     st.rerun()
@@ -227,32 +364,21 @@ Just tell me what you need! 💡"""
         if st.button("Submit URL", use_container_width=True, type="primary", disabled=not url_input):
             if url_input:
                 with st.spinner("📺 Extracting transcript from YouTube..."):
-                    current_time = datetime.utcnow()
                     extracted_text = extract_youtube_transcript(url_input)
                     
-                    current_chat = chats_collection.find_one({"_id": st.session_state.current_chat_id})
+                    current_chat = get_chat_info(st.session_state.current_chat_id)
                     platform = current_chat.get("platform", "General") if current_chat else "General"
                     
                     url_info = f"🔗 URL submitted: [{url_input}]({url_input})"
                     
-                    save_message(
+                    append_message(save_message(
                         st.session_state.current_chat_id,
                         "user",
                         url_info,
                         platform=platform,
                         source=url_input,
                         extracted_content=extracted_text
-                    )
-                    
-                    user_msg = {
-                        "role": "user",
-                        "content": url_info,
-                        "timestamp": current_time,
-                        "chat_id": st.session_state.current_chat_id,
-                        "source": url_input,
-                        "source_type": "url"
-                    }
-                    st.session_state.messages.append(user_msg)
+                    ))
                     
                     assistant_response = f"""✅ I've received your YouTube video!
 
@@ -263,15 +389,7 @@ Just tell me what you need! 💡"""
 
 Let me know how you'd like to use this content! 🎬"""
                     
-                    save_message(st.session_state.current_chat_id, "assistant", assistant_response, platform=platform)
-                    
-                    assistant_msg = {
-                        "role": "assistant",
-                        "content": assistant_response,
-                        "timestamp": current_time,
-                        "chat_id": st.session_state.current_chat_id
-                    }
-                    st.session_state.messages.append(assistant_msg)
+                    append_message(save_message(st.session_state.current_chat_id, "assistant", assistant_response, platform=platform))
                     
                     st.session_state.show_upload_dialog = False
                     st.rerun()
@@ -295,14 +413,40 @@ with st.sidebar:
             st.session_state.show_upload_dialog = True
             st.rerun()
     
+    fresh_variant = st.checkbox(
+        "🔄 Fresh variant",
+        key="fresh_variant",
+        help="Skip cached responses and generate new content for the same request"
+    )
+    
     st.divider()
  
-    all_chats = get_all_chats()
+    search = st.text_input(
+        "Search chats",
+        placeholder="Search by name",
+        key="chat_search",
+        on_change=reset_chat_pages,
+        label_visibility="collapsed"
+    )
+    platform_filter = st.selectbox(
+        "Platform",
+        PLATFORM_FILTERS,
+        key="chat_platform_filter",
+        on_change=reset_chat_pages,
+        label_visibility="collapsed"
+    )
     
-    if len(all_chats) == 0:
-        st.caption("No chats yet. Create one to start!")
+    page_chats, next_cursor = list_chats(
+        search=search,
+        platform=None if platform_filter == PLATFORM_FILTERS[0] else platform_filter,
+        before=st.session_state.chat_page_cursors[-1],
+        limit=CHAT_PAGE_SIZE
+    )
+    
+    if len(page_chats) == 0:
+        st.caption("No matching chats." if search or platform_filter != PLATFORM_FILTERS[0] else "No chats yet. Create one to start!")
     else:
-        for chat in all_chats:
+        for chat in page_chats:
             chat_id = chat["_id"]
             chat_name = chat.get("chat_name", f"Chat {chat_id}")
             platform = chat.get("platform", "General")
@@ -325,8 +469,7 @@ with st.sidebar:
                 ):
                     st.session_state.current_chat_id = chat_id
     
-                    db_messages = load_chat_with_context(chat_id)
-                    st.session_state.messages = db_messages
+                    load_chat_with_context(chat_id)
                     st.rerun()
             
             with col2:
@@ -335,7 +478,22 @@ with st.sidebar:
                     if st.session_state.current_chat_id == chat_id:
                         st.session_state.current_chat_id = None
                         st.session_state.messages = []
+                        st.session_state.has_older_messages = False
+                        st.session_state.has_newer_messages = False
                     st.rerun()
+    
+    if len(st.session_state.chat_page_cursors) > 1 or next_cursor:
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("◀ Newer", key="newer_chats_btn", use_container_width=True,
+                         disabled=len(st.session_state.chat_page_cursors) == 1):
+                st.session_state.chat_page_cursors.pop()
+                st.rerun()
+        with col2:
+            if st.button("Older ▶", key="older_chats_btn", use_container_width=True,
+                         disabled=next_cursor is None):
+                st.session_state.chat_page_cursors.append(next_cursor)
+                st.rerun()
 
 if st.session_state.show_new_chat_dialog:
     new_chat_dialog()
@@ -348,12 +506,17 @@ if st.session_state.current_chat_id is None:
     st.info("👋 Welcome! Create a new chat or select an existing one to start chatting.")
 else:
 
-    current_chat = chats_collection.find_one({"_id": st.session_state.current_chat_id})
+    current_chat = get_chat_info(st.session_state.current_chat_id)
     if current_chat:
         chat_name = current_chat.get("chat_name", f"Chat {st.session_state.current_chat_id}")
         platform = current_chat.get("platform", "General")
         st.caption(f"💬 **{chat_name}** | 📱 {platform}")
  
+    if st.session_state.has_older_messages:
+        if st.button("⬆️ Load older messages", key="load_older_btn"):
+            load_older_messages(st.session_state.current_chat_id)
+            st.rerun()
+    
     for message in st.session_state.messages:
         role = message.get("role", "user")
         content = message.get("content", "")
@@ -367,127 +530,68 @@ else:
                 st.caption(f"📎 {message['source']}")
             
             st.caption(f"🕐 {timestamp.strftime('%I:%M %p')}")
+    
+    if st.session_state.has_newer_messages:
+        if st.button("⬇️ Jump to latest messages", key="load_latest_btn"):
+            show_latest_messages(st.session_state.current_chat_id)
+            st.rerun()
 
 
 prompt = st.chat_input("Type your message here...", disabled=st.session_state.current_chat_id is None)
 
 if prompt:
-    current_time = datetime.utcnow()
-    
-    current_chat = chats_collection.find_one({"_id": st.session_state.current_chat_id})
+    current_chat = get_chat_info(st.session_state.current_chat_id)
     platform = current_chat.get("platform", "General") if current_chat else "General"
    
-    save_message(st.session_state.current_chat_id, "user", prompt, platform=platform)
-    
-    user_msg = {
-        "role": "user",
-        "content": prompt,
-        "timestamp": current_time,
-        "chat_id": st.session_state.current_chat_id
-    }
-    st.session_state.messages.append(user_msg)
+    append_message(save_message(st.session_state.current_chat_id, "user", prompt, platform=platform))
     
     is_generation_request = any(keyword in prompt.lower() for keyword in [
         'generate', 'create', 'write', 'make', 'blog', 'post', 'content', 'draft'
     ])
     
-    extracted_content = None
-    recent_msgs = messages_collection.find({
-        "chat_id": st.session_state.current_chat_id,
-        "extracted_content": {"$exists": True}
-    }).sort("timestamp", -1).limit(1)
-    
-    for msg in recent_msgs:
-        if msg.get("extracted_content"):
-            extracted_content = msg["extracted_content"]
-            break
+    # Only the source's id and name; the text is read where it's used.
+    active_source = get_active_source(st.session_state.current_chat_id)
 
-    with st.spinner("🤔 Thinking..."):
-        if is_generation_request and extracted_content:
-            if platform == "Medium":
+    with st.chat_message("user"):
+        st.markdown(prompt)
 
-                result = generate_medium_blog(
-                    chat_id=st.session_state.current_chat_id,
-                    raw_content=extracted_content,
-                    user_request=prompt,
-                    platform=platform
-                )
-                
-                if result["success"]:
-                    for workflow_msg in result["workflow_messages"]:
-                        assistant_response = workflow_msg.content
-                        
-                        save_message(
-                            st.session_state.current_chat_id, 
-                            "assistant", 
-                            assistant_response, 
-                            platform=platform
-                        )
-                        
-                        assistant_msg = {
-                            "role": "assistant",
-                            "content": assistant_response,
-                            "timestamp": datetime.utcnow(),
-                            "chat_id": st.session_state.current_chat_id
-                        }
-                        st.session_state.messages.append(assistant_msg)
-                    
-                    final_response = f"## 🎉 Your Medium Blog is Ready!\n\n{result['final_blog']}"
-                    
-                else:
-                    final_response = f"❌ Error: {result['error']}"
-            
-            elif platform == "LinkedIn":
-                result = generate_linkedin_post(
-                    chat_id=st.session_state.current_chat_id,
-                    raw_content=extracted_content,
-                    user_request=prompt,
-                    platform=platform
-                )
-                
-                if result["success"]:
-                    for workflow_msg in result["workflow_messages"]:
-                        assistant_response = workflow_msg.content
-                        
-                        save_message(
-                            st.session_state.current_chat_id, 
-                            "assistant", 
-                            assistant_response, 
-                            platform=platform
-                        )
-                        
-                        assistant_msg = {
-                            "role": "assistant",
-                            "content": assistant_response,
-                            "timestamp": datetime.utcnow(),
-                            "chat_id": st.session_state.current_chat_id
-                        }
-                        st.session_state.messages.append(assistant_msg)
-                    
-                    final_response = f"## 🎉 Your LinkedIn Post is Ready!\n\n{result['final_post']}\n\n---\n\n**📊 Character Count:** {len(result['final_post'])} characters"
-                    
+    with st.chat_message("assistant"):
+        if is_generation_request and active_source:
+            if platform in JOB_PLATFORMS:
+                if get_active_job(st.session_state.current_chat_id):
+                    final_response = "⏳ A generation is already running in this chat. Its result will appear here when it's done."
                 else:
-                    final_response = f"❌ Error: {result['error']}"
+                    # The worker posts the stage messages and the result to
+                    # the chat; the next run follows the job's progress.
+                    submit_job(
+                        st.session_state.current_chat_id,
+                        platform,
+                        prompt,
+                        source_id=active_source["_id"],
+                        bypass_cache=fresh_variant
+                    )
+                    st.rerun()
             
             else:
                 final_response = f"🚧 Content generation for {platform} is coming soon! Currently supported: Medium, LinkedIn."
             
         else:
-            assistant_response = process_user_message_with_context(
+            assistant_response = render_stream(stream_user_message_with_context(
                 chat_id=st.session_state.current_chat_id,
                 user_message=prompt,
-                extracted_content=extracted_content[:1000] if extracted_content else None
-            )
+                extracted_content=read_source_text(active_source, 1000) if active_source else None,
+                bypass_cache=fresh_variant
+            ))
             final_response = assistant_response
 
-    save_message(st.session_state.current_chat_id, "assistant", final_response, platform=platform)
-    
-    assistant_msg = {
-        "role": "assistant",
-        "content": final_response,
-        "timestamp": datetime.utcnow(),
-        "chat_id": st.session_state.current_chat_id
-    }
-    st.session_state.messages.append(assistant_msg)
+    append_message(save_message(st.session_state.current_chat_id, "assistant", final_response, platform=platform))
     
     st.rerun()
+
+elif st.session_state.current_chat_id is not None:
+    active_job = get_active_job(st.session_state.current_chat_id)
+    if active_job:
+        with st.chat_message("assistant"):
+            render_job(active_job)
+        show_latest_messages(st.session_state.current_chat_id)
+        st.rerun()